@@ -1,48 +1,158 @@
+import hashlib
 import os
 
-from flask import Flask, render_template, request, flash, redirect, session, g, url_for
-from flask_debugtoolbar import DebugToolbarExtension
+import click
+from flask import (Flask, Blueprint, render_template, request, flash, redirect, session, g,
+                   url_for, abort, current_app, jsonify)
+from flask.cli import with_appcontext
+from werkzeug.local import LocalProxy
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import or_
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.exc import ObjectDeletedError
 from functools import wraps
 
+from config import PROFILES
 from forms import UserAddForm, LoginForm, MessageForm, EditUserForm, ChangePasswordForm
-from models import db, connect_db, User, Message, Likes
+from models import (db, connect_db, hasher, User, Message, Follows, Likes, TimelineEntry, decode_cursor,
+                    DIRECTORY_PAGE_SIZE, DIRECTORY_MAX_PAGE_SIZE)
+from query_budget import init_query_budget
+from replicas import init_replicas
+from index_check import check_indexes
+from fragment_cache import FragmentCache
+from passwords import HasherBusy
+from compression import Compressor
+from static_assets import StaticAssets
+from user_cache import UserCache
 
 CURR_USER_KEY = "curr_user"
 
-app = Flask(__name__)
+compressor = Compressor()
+fragment_cache = FragmentCache()
+user_cache = UserCache()
+static_assets = StaticAssets()
 
-# Get DB_URI from environ variable (useful for production/testing) or,
-# if not set there, use development local db.
-app.config['SQLALCHEMY_DATABASE_URI'] = (
-    os.environ.get('DATABASE_URL', 'postgres:///warbler'))
+views = Blueprint('views', __name__)
 
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SQLALCHEMY_ECHO'] = False
-app.config['DEBUG_TB_INTERCEPT_REDIRECTS'] = False
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', "it's a secret")
-app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
-toolbar = DebugToolbarExtension(app)
 
-connect_db(app)
+def create_app(config=None):
+    """Build the Warbler app.
+
+    `config` is a profile name from config.PROFILES ('development',
+    'testing' or 'production'), or a config object; it defaults to the
+    FLASK_CONFIG environment variable, then 'development'.
+    """
+
+    if config is None:
+        config = os.environ.get('FLASK_CONFIG', 'development')
+
+    app = Flask(__name__)
+    app.config.from_object(PROFILES.get(config, config))
+
+    # registered before the toolbar and the other after_request hooks, so it
+    # compresses what they produce
+    compressor.init_app(app)
+
+    if app.config['DEBUG_TOOLBAR']:
+        from flask_debugtoolbar import DebugToolbarExtension
+        DebugToolbarExtension(app)
+
+    connect_db(app)
+    init_replicas(app)
+    init_query_budget(app)
+    hasher.init_app(app)
+    fragment_cache.init_app(app)
+    static_assets.init_app(app)
+
+    if not app.config.get('BUILD_VERSION'):
+        app.config['BUILD_VERSION'] = build_version(app)
+
+    app.register_blueprint(views)
+
+    for command in (backfill_timelines, reconcile_counts, check_indexes_command):
+        app.cli.add_command(command)
+
+    return app
+
+
+def build_version(app):
+    """A digest of `app`'s templates and static file fingerprints.
+
+    Part of every page ETag, so a deploy that changes what pages look like
+    (or which fingerprinted assets they link to) invalidates the browser's
+    copies.
+    """
+
+    digest = hashlib.sha1()
+    template_folder = os.path.join(app.root_path, app.template_folder)
+
+    for root, dirs, filenames in os.walk(template_folder):
+        dirs.sort()
+        for name in sorted(filenames):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, template_folder).encode('UTF-8'))
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+
+    digest.update(repr(sorted(app.extensions['static_assets'].manifest.items())).encode('UTF-8'))
+
+    return digest.hexdigest()[:12]
+
+
+def route(rule, **options):
+    """Like views.route(), but keeps the plain endpoint name (url_for('homepage'))."""
+
+    def decorator(f):
+        views.record(lambda state: state.app.add_url_rule(rule, f.__name__, f, **options))
+        return f
+
+    return decorator
 
 
 ##############################################################################
 # User signup/login/logout
 
 
-@app.before_request
+@views.before_app_request
 def add_user_to_g():
-    """If we're logged in, add curr user to Flask global."""
+    """If we're logged in, add curr user to Flask global.
 
-    if CURR_USER_KEY in session:
-        g.user = User.query.get(session[CURR_USER_KEY])
+    g.user is a proxy that loads the user the first time it's used, so
+    requests that only need g.user_id don't touch the database.
+    """
+
+    g.user_id = session.get(CURR_USER_KEY)
+
+    if g.user_id is not None:
+        g.user = LocalProxy(load_current_user)
 
     else:
         g.user = None
 
 
+def load_current_user():
+    """The logged-in User, loaded (or taken from user_cache) once per request."""
+
+    if '_current_user' not in g:
+        user = user_cache.get(g.user_id)
+
+        if user is None:
+            # the account was deleted from another session
+            do_logout()
+            flash("Access unauthorized.", "danger")
+            abort(redirect(url_for('homepage')))
+
+        g._current_user = user
+
+    return g._current_user
+
+
+def clear_id_sets():
+    """Forget g.user's follow/like ID sets after a write, if it was loaded."""
+
+    if '_current_user' in g:
+        g._current_user.clear_id_sets()
+
+
 def do_login(user):
     """Log in user."""
 
@@ -60,13 +170,72 @@ def do_logout():
 def auth_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not g.user:
+        if g.user_id is None:
             flash("Access unauthorized.", "danger")
             return redirect(url_for('homepage'))
         return f(*args, **kwargs)
     return decorated_function 
 
-@app.route('/signup', methods=["GET", "POST"])
+##############################################################################
+# Feed pagination
+
+def home_feed_page(user_id, before=None):
+    """A page of the home feed.
+
+    Normally read from the materialized timeline; with MATERIALIZED_TIMELINES
+    off (e.g. before backfill-timelines has run) it's read live from
+    messages and follows in one statement instead.
+    """
+
+    if current_app.config['MATERIALIZED_TIMELINES']:
+        return Message.timeline_page(user_id, before=before)
+
+    return Message.home_feed_page(user_id, before=before)
+
+
+# feed name -> (full page endpoint, page query)
+FEEDS = {
+    'home': ('homepage', home_feed_page),
+    'messages': ('users_show', Message.posted_page),
+    'likes': ('show_likes', Message.liked_page),
+}
+
+
+def get_cursor():
+    """Decode the 'before' cursor from the querystring, if there is one."""
+
+    cursor = request.args.get('before')
+
+    if not cursor:
+        return None
+
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        abort(400)
+
+
+def feed_context(feed, user_id, messages, next_cursor):
+    """Template variables for rendering a page of feed rows.
+
+    `older_url` is the plain link to the next page (works without JS),
+    `more_url` is the "load more" endpoint that returns just the rows.
+    `liked_ids` are the messages on the home feed the viewer likes.
+    """
+
+    liked_ids = g.user.liked_among([msg.id for msg in messages]) if feed == 'home' else set()
+    context = dict(feed=feed, messages=messages, liked_ids=liked_ids,
+                   older_url=None, more_url=None)
+
+    if next_cursor:
+        url_args = {} if feed == 'home' else {'user_id': user_id}
+        context['older_url'] = url_for(FEEDS[feed][0], before=next_cursor, **url_args)
+        context['more_url'] = url_for('feed_page', feed=feed, before=next_cursor, **url_args)
+
+    return context
+
+
+@route('/signup', methods=["GET", "POST"])
 def signup():
     """Handle user signup.
 
@@ -86,7 +255,7 @@ def signup():
                 username=form.username.data,
                 password=form.password.data,
                 email=form.email.data,
-                image_url=form.image_url.data or User.image_url.default.arg,
+                image_url=form.image_url.data,
             )
             db.session.commit()
 
@@ -102,7 +271,7 @@ def signup():
         return render_template('users/signup.html', form=form)
 
 
-@app.route('/login', methods=["GET", "POST"])
+@route('/login', methods=["GET", "POST"])
 def login():
     """Handle user login."""
 
@@ -113,6 +282,8 @@ def login():
                                  form.password.data)
 
         if user:
+            # saves a rehashed password, if authenticate() upgraded it
+            db.session.commit()
             do_login(user)
             flash(f"Hello, {user.username}!", "success")
             return redirect(url_for('homepage'))
@@ -122,7 +293,31 @@ def login():
     return render_template('users/login.html', form=form)
 
 
-@app.route('/logout')
+@views.app_errorhandler(HasherBusy)
+def hasher_busy(error):
+    """Too many logins at once: ask the client to retry instead of queueing."""
+
+    current_app.logger.warning("Password hashing queue full: %s", hasher.stats())
+
+    return "Too many sign-ins right now, please try again.", 503, {'Retry-After': '1'}
+
+
+@views.app_errorhandler(ObjectDeletedError)
+def current_user_deleted(error):
+    """The cached current user was deleted in another process: log them out."""
+
+    db.session.rollback()
+
+    if g.get('user_id') is None or user_cache.reload(g.user_id) is not None:
+        raise error
+
+    do_logout()
+    flash("Access unauthorized.", "danger")
+
+    return redirect(url_for('homepage'))
+
+
+@route('/logout')
 def logout():
     """Handle logout of user."""
     
@@ -132,88 +327,222 @@ def logout():
     return redirect(url_for('homepage'))
 
 
+##############################################################################
+# Conditional GET
+#
+# Pages a browser has already seen are answered with 304 Not Modified when
+# a cheap validator (ids, timestamps, counters and profile versions) says
+# nothing on them has changed, skipping the full queries and the render.
+# The build version is part of every validator, so a deploy that changes
+# templates or static files re-renders pages browsers already have.
+
+
+def page_etag(*parts):
+    """A strong ETag for this URL built from `parts`, the viewer's state and the build."""
+
+    viewer = (g.user_id, g.user.profile_version) if g.user_id is not None else None
+    key = repr((current_app.config['BUILD_VERSION'], request.full_path, viewer) + parts)
+
+    return hashlib.sha1(key.encode('UTF-8')).hexdigest()
+
+
+def not_modified(etag, last_modified=None):
+    """A 304 response if the browser's copy has `etag`, otherwise None.
+
+    Pages with pending flash messages are never treated as cached, since
+    the flash is shown only once.
+    """
+
+    if '_flashes' in session:
+        return None
+
+    g.etag = etag
+    g.last_modified = last_modified
+
+    if request.if_none_match.contains_weak(etag):
+        return current_app.response_class(status=304)
+
+    return None
+
+
+@views.after_app_request
+def add_etag(response):
+    """Send the page's ETag and have the browser revalidate before reuse."""
+
+    etag = g.get('etag')
+
+    if etag and response.status_code in (200, 304):
+        response.set_etag(etag)
+        response.last_modified = g.last_modified
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Cookie')
+
+    return response
+
+
+##############################################################################
+# Follow and like writes, shared by the form routes and the JSON API.
+# Each is a single-row write that's a no-op if nothing changes.
+
+def follow(user_id):
+    """Have the logged-in user follow `user_id`."""
+
+    if Follows.add(g.user_id, user_id):
+        TimelineEntry.add_author(user_id=g.user_id, author_id=user_id)
+        User.adjust_counts(g.user_id, following_count=1)
+        User.adjust_counts(user_id, followers_count=1)
+
+    db.session.commit()
+    clear_id_sets()
+
+
+def unfollow(user_id):
+    """Have the logged-in user stop following `user_id`."""
+
+    if Follows.remove(g.user_id, user_id):
+        TimelineEntry.remove_author(user_id=g.user_id, author_id=user_id)
+        User.adjust_counts(g.user_id, following_count=-1)
+        User.adjust_counts(user_id, followers_count=-1)
+
+    db.session.commit()
+    clear_id_sets()
+
+
+def like(message_id):
+    """Have the logged-in user like `message_id`."""
+
+    if Likes.add(g.user_id, message_id):
+        User.adjust_counts(g.user_id, likes_count=1)
+        Message.adjust_counts(message_id, likes_count=1)
+
+    db.session.commit()
+    clear_id_sets()
+
+
+def unlike(message_id):
+    """Have the logged-in user stop liking `message_id`."""
+
+    if Likes.remove(g.user_id, message_id):
+        User.adjust_counts(g.user_id, likes_count=-1)
+        Message.adjust_counts(message_id, likes_count=-1)
+
+    db.session.commit()
+    clear_id_sets()
+
+
 ##############################################################################
 # General user routes:
 
-@app.route('/users')
+@route('/users')
 def list_users():
     """Page with listing of users.
 
-    Can take a 'q' param in querystring to search by that username.
+    Can take a 'q' param in querystring to search by that username;
+    results are ranked by closeness of match and capped.
+
+    Without a search, users are listed a page at a time: 'after' is the
+    last user id on the previous page and 'per_page' the page size.
     """
 
     search = request.args.get('q')
+    next_after = None
 
     if not search:
-        users = User.query.all()
+        after = request.args.get('after', type=int)
+        per_page = request.args.get('per_page', DIRECTORY_PAGE_SIZE, type=int)
+        per_page = max(1, min(per_page, DIRECTORY_MAX_PAGE_SIZE))
+
+        users, next_after = User.directory_page(after=after, per_page=per_page)
     else:
-        users = User.query.filter(User.username.like(f"%{search}%")).all()
+        users = User.search(search)
 
-    return render_template('users/index.html', users=users)
+    followed_ids = g.user.following_among([user.id for user in users]) if g.user_id else set()
 
+    return render_template('users/index.html', users=users, next_after=next_after,
+                           followed_ids=followed_ids)
 
-@app.route('/users/<int:user_id>')
+
+@route('/users/<int:user_id>')
 def users_show(user_id):
     """Show user profile."""
 
     user = User.query.get_or_404(user_id)
 
+    following = g.user_id is not None and bool(g.user.following_among([user_id]))
+    response = not_modified(page_etag(
+        'user', user.id, user.profile_version, user.messages_count, user.following_count,
+        user.followers_count, user.likes_count, Message.latest_posted(user_id), following))
+
+    if response:
+        return response
+
     # snagging messages in order from the database;
     # user.messages won't be in order by default
-    messages = (Message
-                .query
-                .filter(Message.user_id == user_id)
-                .order_by(Message.timestamp.desc())
-                .limit(100)
-                .all())
-    return render_template('users/show.html', user=user, messages=messages)
+    messages, next_cursor = Message.posted_page(user_id, before=get_cursor())
 
+    return render_template('users/show.html', user=user, viewer_follows=following,
+                           **feed_context('messages', user_id, messages, next_cursor))
 
-@app.route('/users/<int:user_id>/following')
+
+@route('/users/<int:user_id>/following')
 @auth_required
 def show_following(user_id):
-    """Show list of people this user is following."""
+    """Show list of people this user is following, newest follow first.
+
+    Takes a 'before' cursor for older pages.
+    """
 
     user = User.query.get_or_404(user_id)
-    return render_template('users/following.html', user=user)
+    following, next_cursor = User.following_page(user_id, before=get_cursor())
+    # the viewer's follows among the listed people, and of the user themself
+    followed_ids = g.user.following_among([user_id] + [person.id for person in following])
 
+    return render_template('users/following.html', user=user, following=following,
+                           followed_ids=followed_ids, viewer_follows=user_id in followed_ids,
+                           next_cursor=next_cursor)
 
-@app.route('/users/<int:user_id>/followers')
+
+@route('/users/<int:user_id>/followers')
 @auth_required
 def users_followers(user_id):
-    """Show list of followers of this user."""
+    """Show list of followers of this user, newest follow first.
+
+    Takes a 'before' cursor for older pages.
+    """
 
     user = User.query.get_or_404(user_id)
-    return render_template('users/followers.html', user=user)
+    followers, next_cursor = User.followers_page(user_id, before=get_cursor())
+    followed_ids = g.user.following_among([user_id] + [person.id for person in followers])
 
+    return render_template('users/followers.html', user=user, followers=followers,
+                           followed_ids=followed_ids, viewer_follows=user_id in followed_ids,
+                           next_cursor=next_cursor)
 
-@app.route('/users/follow/<int:follow_id>', methods=['POST'])
+
+@route('/users/follow/<int:follow_id>', methods=['POST'])
 @auth_required
 def add_follow(follow_id):
     """Add a follow for the currently-logged-in user."""
 
     followed_user = User.query.get_or_404(follow_id)
-    g.user.following.append(followed_user)
-    db.session.commit()
+    follow(followed_user.id)
 
     # return redirect(f"/users/{g.user.id}/following")
-    return redirect(url_for('show_following', user_id=g.user.id))
+    return redirect(url_for('show_following', user_id=g.user_id))
 
 
-@app.route('/users/stop-following/<int:follow_id>', methods=['POST'])
+@route('/users/stop-following/<int:follow_id>', methods=['POST'])
 @auth_required
 def stop_following(follow_id):
     """Have currently-logged-in-user stop following this user."""
 
-    followed_user = User.query.get(follow_id)
-    g.user.following.remove(followed_user)
-    db.session.commit()
+    unfollow(follow_id)
 
     # return redirect(f"/users/{g.user.id}/following")
-    return redirect(url_for('show_following', user_id=g.user.id))
+    return redirect(url_for('show_following', user_id=g.user_id))
 
 
-@app.route('/users/profile', methods=["GET", "POST"])
+@route('/users/profile', methods=["GET", "POST"])
 @auth_required
 def profile():
     """Update profile for current user."""
@@ -229,18 +558,20 @@ def profile():
             g.user.header_image_url = form.header_image_url.data
             g.user.bio = form.bio.data
             g.user.location = form.location.data
+            g.user.profile_version = User.profile_version + 1
 
             db.session.commit()
+            user_cache.forget(g.user_id)
 
             flash("User profile updated.", "success")
             # return redirect(f"/users/{g.user.id}")
-            return redirect(url_for('users_show', user_id=g.user.id))
+            return redirect(url_for('users_show', user_id=g.user_id))
 
         form.password.errors.append("Wrong password, please try again.")
 
-    return render_template("users/edit.html", form=form, user_id=g.user.id)
+    return render_template("users/edit.html", form=form, user_id=g.user_id)
 
-@app.route('/users/edit-password', methods=["GET", "POST"])
+@route('/users/edit-password', methods=["GET", "POST"])
 @auth_required
 def edit_password():
     """Edit password for current user."""
@@ -253,64 +584,84 @@ def edit_password():
             new_hashed_pwd = User.changePassword(form.new_password.data)
             g.user.password = new_hashed_pwd
             db.session.commit()
+            user_cache.forget(g.user_id)
             flash("Password updated.", "success")
             # return redirect("/users/profile")
             return redirect(url_for('profile'))
 
         form.current_password.errors.append("Wrong current password, please try again.")
 
-    return render_template("users/edit-password.html", form=form, user_id=g.user.id)
+    return render_template("users/edit-password.html", form=form, user_id=g.user_id)
 
 
-@app.route('/users/delete', methods=["POST"])
+@route('/users/delete', methods=["POST"])
 @auth_required
 def delete_user():
     """Delete user."""
 
     do_logout()
 
-    db.session.delete(g.user)
+    # users whose follower/following/like counts include this user
+    affected_ids = (g.user.follower_ids | g.user.following_ids |
+                    {user_id for (user_id,) in db.session
+                        .query(Likes.user_id)
+                        .join(Message, Message.id == Likes.message_id)
+                        .filter(Message.user_id == g.user_id)})
+    affected_ids.discard(g.user_id)
+
+    # and the messages they like
+    Message.adjust_counts(Message.id.in_(db.session
+                                         .query(Likes.message_id)
+                                         .filter(Likes.user_id == g.user_id)),
+                          likes_count=-1)
+
+    db.session.delete(g.user._get_current_object())
+    db.session.flush()
+
+    if affected_ids:
+        User.reconcile_counts(User.id.in_(affected_ids))
+
     db.session.commit()
+    user_cache.forget(g.user_id)
 
     return redirect(url_for('signup'))
 
-@app.route('/users/add_like/<int:message_id>', methods=["POST"])
+@route('/users/add_like/<int:message_id>', methods=["POST"])
 @auth_required
 def add_like(message_id):
     """ Add a like """
 
     liked_message = Message.query.get_or_404(message_id)
-    g.user.likes.append(liked_message)
-    db.session.commit()
+    like(liked_message.id)
 
     return redirect(url_for('homepage'))
 
-@app.route('/users/remove_like/<int:message_id>', methods=["POST"])
+@route('/users/remove_like/<int:message_id>', methods=["POST"])
 @auth_required
 def remove_like(message_id):
     """ Remove Like """
 
-    unliked_message = Message.query.get_or_404(message_id)
-    g.user.likes.remove(unliked_message)
-    db.session.commit()
+    unlike(message_id)
 
     return redirect(url_for('homepage'))
 
-@app.route('/users/<int:user_id>/likes')
+@route('/users/<int:user_id>/likes')
 @auth_required
 def show_likes(user_id):
     """ Show a list of user's liked messages. """
     
     user = User.query.get_or_404(user_id)
-    messages = user.likes
+    messages, next_cursor = Message.liked_page(user_id, before=get_cursor())
+    viewer_follows = bool(g.user.following_among([user_id]))
 
-    return render_template("/users/likes.html", user=user, messages=messages)
+    return render_template("/users/likes.html", user=user, viewer_follows=viewer_follows,
+                           **feed_context('likes', user_id, messages, next_cursor))
 
 
 ##############################################################################
 # Messages routes:
 
-@app.route('/messages/new', methods=["GET", "POST"])
+@route('/messages/new', methods=["GET", "POST"])
 @auth_required
 def messages_add():
     """Add a message:
@@ -321,63 +672,240 @@ def messages_add():
     form = MessageForm()
 
     if form.validate_on_submit():
-        msg = Message(text=form.text.data)
-        g.user.messages.append(msg)
+        # logs out an account deleted elsewhere (usually a user cache hit)
+        load_current_user()
+
+        # not g.user.messages.append(), which loads all of the user's messages
+        msg = Message(text=form.text.data, user_id=g.user_id)
+        db.session.add(msg)
+        db.session.flush()
+        TimelineEntry.fan_out(msg)
+        User.adjust_counts(g.user_id, messages_count=1)
         db.session.commit()
 
         # return redirect(f"/users/{g.user.id}")
-        return redirect(url_for('users_show', user_id=g.user.id))
+        return redirect(url_for('users_show', user_id=g.user_id))
 
     return render_template('messages/new.html', form=form)
 
-@app.route('/messages/<int:message_id>', methods=["GET"])
+@route('/messages/<int:message_id>', methods=["GET"])
 def messages_show(message_id):
     """Show a message."""
 
-    msg = Message.query.get_or_404(message_id)
-    return render_template('messages/show.html', message=msg)
+    msg = Message.query.options(joinedload(Message.user)).get_or_404(message_id)
+
+    following = g.user_id is not None and bool(g.user.following_among([msg.user_id]))
+    response = not_modified(page_etag(
+        'message', msg.id, msg.timestamp, msg.user.profile_version, following),
+        last_modified=msg.timestamp)
+
+    if response:
+        return response
+
+    return render_template('messages/show.html', message=msg, viewer_follows=following)
 
 
-@app.route('/messages/<int:message_id>/delete', methods=["POST"])
+@route('/messages/<int:message_id>/delete', methods=["POST"])
 @auth_required
 def messages_destroy(message_id):
     """Delete a message."""
 
     msg = Message.query.get_or_404(message_id)
 
-    if msg.user_id != g.user.id:
+    if msg.user_id != g.user_id:
         flash("Access unauthorized.", "danger")
         return redirect(url_for('homepage'))
 
+    TimelineEntry.remove_message(msg.id)
+    fragment_cache.forget_message(msg.id)
+    User.adjust_counts(g.user_id, messages_count=-1)
+    User.adjust_counts(User.id.in_(db.session
+                                   .query(Likes.user_id)
+                                   .filter(Likes.message_id == msg.id)),
+                       likes_count=-1)
     db.session.delete(msg)
     db.session.commit()
 
     # return redirect(f"/users/{g.user.id}")
-    return redirect(url_for('users_show', user_id=g.user.id))
+    return redirect(url_for('users_show', user_id=g.user_id))
+
+@route('/feeds/<any(home, messages, likes):feed>')
+def feed_page(feed):
+    """Render the next page of a feed as bare <li> rows, for "load more".
+
+    'messages' and 'likes' take the owner in a 'user_id' param; 'home'
+    is always the logged-in user's timeline.
+    """
+
+    if feed != 'messages' and g.user_id is None:
+        abort(401)
+
+    user_id = g.user_id if feed == 'home' else request.args.get('user_id', type=int)
+
+    if user_id is None:
+        abort(404)
+
+    messages, next_cursor = FEEDS[feed][1](user_id, before=get_cursor())
+
+    return render_template('messages/_feed.html',
+                           **feed_context(feed, user_id, messages, next_cursor))
+
+
+##############################################################################
+# JSON API for like and follow buttons (see static/scripts/warbler.js).
+# POST adds, DELETE removes; both return the new state and counts, keyed
+# by user id, so a click doesn't reload the page.
+
+def api_auth_required(f):
+    """Like auth_required, but answering 401 JSON instead of redirecting."""
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if g.user_id is None:
+            return jsonify(error="Access unauthorized."), 401
+
+        return f(*args, **kwargs)
+
+    return decorated_function
+
+
+def user_counts(*user_ids, columns):
+    """{user id: {column name: value}} for `columns` of `user_ids`, in one query."""
+
+    rows = (db.session.query(User.id, *columns)
+            .filter(User.id.in_(user_ids))
+            .all())
+
+    return {row.id: {column.key: getattr(row, column.key) for column in columns} for row in rows}
+
+
+@route('/api/likes/<int:message_id>', methods=['POST', 'DELETE'])
+@api_auth_required
+def api_like(message_id):
+    """Like or unlike a message."""
+
+    if request.method == 'POST':
+        try:
+            like(message_id)
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify(error="No such message."), 404
+    else:
+        unlike(message_id)
+
+    counts = user_counts(g.user_id, columns=[User.likes_count])
+    likes_count = (db.session.query(Message.likes_count)
+                   .filter(Message.id == message_id)
+                   .scalar())
+
+    if likes_count is None:
+        return jsonify(error="No such message."), 404
+
+    return jsonify(message_id=message_id, liked=request.method == 'POST',
+                   likes_count=likes_count, counts=counts)
+
+
+@route('/api/follows/<int:user_id>', methods=['POST', 'DELETE'])
+@api_auth_required
+def api_follow(user_id):
+    """Follow or unfollow a user."""
+
+    if request.method == 'POST':
+        try:
+            follow(user_id)
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify(error="No such user."), 404
+    else:
+        unfollow(user_id)
+
+    counts = user_counts(g.user_id, user_id, columns=[User.following_count, User.followers_count])
+
+    if user_id not in counts:
+        return jsonify(error="No such user."), 404
+
+    return jsonify(user_id=user_id, following=request.method == 'POST', counts=counts)
+
 
 ##############################################################################
 # Homepage and error pages
 
-@app.route('/')
+@route('/')
 def homepage():
     """Show homepage:
 
     - anon users: no messages
-    - logged in: 100 most recent messages of followed_users
+    - logged in: 100 most recent messages of followed_users, with a
+      'before' cursor for older pages
+
+    Messages are read from the user's materialized timeline, which is
+    kept up to date by messages_add(), messages_destroy(), add_follow()
+    and stop_following(). Repeat visits to an unchanged page get a 304.
     """
 
-    if g.user:
+    if g.user_id is not None:
+        before = get_cursor()
+
+        if current_app.config['MATERIALIZED_TIMELINES']:
+            page = TimelineEntry.page_key(g.user_id, before)
+            response = not_modified(page_etag(
+                'home', g.user.messages_count, g.user.following_count, g.user.followers_count,
+                page, g.user.liked_among([message_id for (message_id, *_) in page])))
 
-        followed_ids = [user.id for user in g.user.following]
+            if response:
+                return response
 
-        messages = (Message
-                .query
-                .filter(or_(Message.user_id == g.user.id, Message.user_id.in_(followed_ids)))
-                .order_by(Message.timestamp.desc())
-                .limit(100)
-                .all())
+        messages, next_cursor = home_feed_page(g.user_id, before=before)
 
-        return render_template('home.html', messages=messages, curr_user_id=g.user.id)
+        return render_template('home.html',
+                               **feed_context('home', g.user_id, messages, next_cursor))
 
     else:
         return render_template('home-anon.html')
+
+
+##############################################################################
+# Maintenance commands
+
+@click.command('backfill-timelines')
+@with_appcontext
+@click.option('--user-id', type=int, help="Only rebuild this user's timeline.")
+def backfill_timelines(user_id):
+    """Rebuild users' home timelines from existing messages and follows."""
+
+    if user_id is None:
+        count = TimelineEntry.backfill()
+    else:
+        count = TimelineEntry.rebuild(user_id)
+
+    db.session.commit()
+
+    click.echo(f"Wrote {count} timeline entries.")
+
+
+@click.command('reconcile-counts')
+@with_appcontext
+def reconcile_counts():
+    """Recompute users' and messages' counts where they've drifted."""
+
+    fixed = User.reconcile_counts()
+    fixed_messages = Message.reconcile_counts()
+    db.session.commit()
+
+    click.echo(f"Fixed counts for {fixed} users and {fixed_messages} messages.")
+
+
+@click.command('check-indexes')
+@with_appcontext
+def check_indexes_command():
+    """EXPLAIN the main routes' queries and check they use their indexes."""
+
+    results = check_indexes()
+
+    for description, index, used, plan in results:
+        click.echo(f"{'ok' if used else 'MISSING'}  {description} ({index})")
+        if not used:
+            click.echo(plan)
+
+    if not all(used for _, _, used, _ in results):
+        raise SystemExit(1)
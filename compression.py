@@ -0,0 +1,95 @@
+"""Response compression.
+
+HTML pages (a timeline page repeats the same markup a hundred times) and
+other text responses are compressed with brotli or gzip, whichever the
+client prefers in Accept-Encoding. Small responses (under
+COMPRESS_MIN_SIZE bytes) aren't worth it, files sent straight from disk
+(images, fonts) are left alone, and COMPRESS_LEVEL / COMPRESS_BR_LEVEL
+trade CPU for size.
+
+Compressed responses get a weak ETag, since the bytes differ from the
+uncompressed page's; conditional GETs compare ETags weakly anyway.
+
+brotli is optional: without the package only gzip is offered.
+"""
+
+import gzip
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html',
+    'text/css',
+    'text/plain',
+    'application/javascript',
+    'application/json',
+    'image/svg+xml',
+}
+
+
+class Compressor:
+    """An after_request hook that compresses text responses."""
+
+    def init_app(self, app):
+        """Read the COMPRESS_* settings and register the hook."""
+
+        app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+        app.config.setdefault('COMPRESS_LEVEL', 6)
+        app.config.setdefault('COMPRESS_BR_LEVEL', 4)
+
+        app.extensions['compressor'] = self
+        app.after_request(self.compress)
+
+    def encodings(self):
+        """The encodings we can produce, best first."""
+
+        return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+    def choose_encoding(self):
+        """The client's most preferred encoding that we can produce, or None."""
+
+        quality = {enc: request.accept_encodings[enc] for enc in self.encodings()}
+        best = max(self.encodings(), key=quality.get)
+
+        return best if quality[best] else None
+
+    def compress(self, response):
+        """Compress `response` in place if it's worth it."""
+
+        response.vary.add('Accept-Encoding')
+
+        if (response.direct_passthrough
+                or response.status_code < 200
+                or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        encoding = self.choose_encoding()
+
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+
+        if len(data) < current_app.config['COMPRESS_MIN_SIZE']:
+            return response
+
+        if encoding == 'br':
+            data = brotli.compress(data, quality=current_app.config['COMPRESS_BR_LEVEL'])
+        else:
+            data = gzip.compress(data, compresslevel=current_app.config['COMPRESS_LEVEL'])
+
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+
+        return response
@@ -0,0 +1,85 @@
+"""Configuration profiles for create_app().
+
+Pick one with create_app('production') or the FLASK_CONFIG environment
+variable. Most settings can also be overridden from the environment.
+"""
+
+import os
+
+
+class Config:
+    """Settings shared by every profile."""
+
+    # Get DB_URI from environ variable (useful for production/testing) or,
+    # if not set there, use development local db.
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgres:///warbler')
+
+    # read replicas (comma-separated URLs), as binds replica_0, replica_1, ...
+    SQLALCHEMY_BINDS = {
+        f'replica_{i}': url
+        for i, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')))
+    }
+    # how long a client's reads stay on the primary after it writes
+    REPLICA_PIN_SECONDS = float(os.environ.get('REPLICA_PIN_SECONDS', 5))
+
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ECHO = False
+    SECRET_KEY = os.environ.get('SECRET_KEY', "it's a secret")
+    SEND_FILE_MAX_AGE_DEFAULT = 0
+
+    MATERIALIZED_TIMELINES = os.environ.get('MATERIALIZED_TIMELINES', 'true').lower() != 'false'
+    USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', 60))
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 10000))
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    BCRYPT_POOL_SIZE = int(os.environ.get('BCRYPT_POOL_SIZE', 2))
+    # identifies the deployed code in page ETags (e.g. a release id or git
+    # commit); unset, it's a digest of the templates and static files
+    BUILD_VERSION = os.environ.get('BUILD_VERSION')
+
+    # install flask-debugtoolbar (it's only active when DEBUG is on too)
+    DEBUG_TOOLBAR = False
+
+
+class DevelopmentConfig(Config):
+    """Local development: debug mode and the debug toolbar."""
+
+    DEBUG = True
+    DEBUG_TOOLBAR = True
+    DEBUG_TB_INTERCEPT_REDIRECTS = False
+
+
+class TestingConfig(Config):
+    """The test suite: test database, cheap hashing, no cross-request caching."""
+
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgresql:///warbler-test')
+    WTF_CSRF_ENABLED = False
+
+    BCRYPT_LOG_ROUNDS = 4
+    BCRYPT_POOL_SIZE = 0
+    # ids are reused between tests, so don't keep users across requests
+    USER_CACHE_TTL = 0
+
+    # fail any request that runs more SQL than this, to catch N+1 regressions
+    SQL_QUERY_BUDGET = 10
+    SQL_QUERY_BUDGET_STRICT = True
+
+
+class ProductionConfig(Config):
+    """Serving real traffic: no toolbar, a sized connection pool."""
+
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        # check connections before use, and replace them before the
+        # server or a proxy in between drops them for being idle
+        'pool_pre_ping': True,
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    }
+
+
+PROFILES = {
+    'development': DevelopmentConfig,
+    'testing': TestingConfig,
+    'production': ProductionConfig,
+}
@@ -0,0 +1,79 @@
+"""Cache of rendered message HTML for timelines.
+
+A message's text never changes and its author's name and picture rarely
+do, so the HTML for each timeline row can be rendered once and reused.
+Entries are keyed by message id and stamped with the author's id and
+profile_version (plus the message timestamp, in case ids are reused after
+the database is rebuilt): editing a profile bumps the version, which makes every
+cached row by that author stale. Deleting a message drops its entry.
+
+Only the viewer-independent part of a row is cached (see
+templates/messages/_message.html); like buttons are rendered per request.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+
+from flask import current_app, render_template
+from markupsafe import Markup
+
+
+class FragmentCache:
+    """A bounded, thread-safe LRU of rendered message fragments."""
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def init_app(self, app):
+        """Make `message_fragment(msg)` available to templates.
+
+        The app's FRAGMENT_CACHE_SIZE, if set, overrides the size given here.
+        """
+
+        app.extensions['fragment_cache'] = self
+        app.add_template_global(self.message_fragment)
+
+    def message_fragment(self, msg):
+        """The rendered HTML for `msg`, from the cache if it's fresh."""
+
+        stamp = (msg.user_id, msg.user.profile_version, msg.timestamp)
+
+        with self._lock:
+            entry = self._entries.get(msg.id)
+
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(msg.id)
+                self.hits += 1
+                return entry[1]
+
+            self.misses += 1
+
+        html = Markup(render_template('messages/_message.html', msg=msg))
+        max_size = current_app.config.get('FRAGMENT_CACHE_SIZE', self.max_size)
+
+        if max_size:
+            with self._lock:
+                self._entries[msg.id] = (stamp, html)
+                self._entries.move_to_end(msg.id)
+
+                while len(self._entries) > max_size:
+                    self._entries.popitem(last=False)
+
+        return html
+
+    def forget_message(self, message_id):
+        """Drop a message's cached HTML (e.g. when it's deleted)."""
+
+        with self._lock:
+            self._entries.pop(message_id, None)
+
+    def clear(self):
+        """Drop everything."""
+
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
@@ -2,27 +2,58 @@
 
 Students won't need to run this for the exercise; they will just use the CSV
 files that this generates. You should only need to run this if you wanted to
-tweak the CSV formats or generate fewer/more rows.
+tweak the CSV formats or generate fewer/more rows, e.g. for load testing:
+
+    python generator/create_csvs.py                       # the sample data
+    python generator/create_csvs.py --scale 1m --out /data/warbler-1m
+    python generator/create_csvs.py --users 5000 --follows 100000 --seed 7
+
+Rows are generated in fixed-size chunks, each with its own random seed, by a
+pool of worker processes; nothing is held in memory beyond one chunk, and the
+same --seed and --now always give the same files, whatever --workers is.
+It runs offline: header images come from header_images.txt.
+
+Follower counts follow a power law (a few users have most of the followers),
+active users post much more than others, messages come in bursts, and likes
+favour popular messages. Load the files with seed.py.
 """
 
+import argparse
 import csv
-from random import choice, randint, sample
-from itertools import permutations
-import requests
+import os
+import shutil
+from datetime import datetime
+from multiprocessing import Pool
+from random import Random
+from time import perf_counter
+
 from faker import Faker
-from helpers import get_random_datetime
+from helpers import get_bursty_datetime, get_random_datetime, out_degree, scatter, scatter_step, zipf_rank
 
 MAX_WARBLER_LENGTH = 140
 
 USERS_CSV_HEADERS = ['email', 'username', 'image_url', 'password', 'bio', 'header_image_url', 'location']
 MESSAGES_CSV_HEADERS = ['text', 'timestamp', 'user_id']
 FOLLOWS_CSV_HEADERS = ['user_being_followed_id', 'user_following_id']
+LIKES_CSV_HEADERS = ['user_id', 'message_id']
 
-NUM_USERS = 300
-NUM_MESSAGES = 1000
-NUM_FOLLWERS = 5000
+SCALES = {
+    'sample': dict(users=300, messages=1000, follows=5000, likes=3000),
+    '10k': dict(users=10_000, messages=200_000, follows=500_000, likes=1_000_000),
+    '1m': dict(users=1_000_000, messages=20_000_000, follows=50_000_000, likes=100_000_000),
+    '10m': dict(users=10_000_000, messages=200_000_000, follows=500_000_000, likes=1_000_000_000),
+}
 
-fake = Faker()
+# rows (or, for follows and likes, users) per unit of work
+CHUNK_SIZE = 20_000
+
+# how skewed followers, posting and likes are (Zipf exponents)
+POPULARITY_EXPONENT = 1.1
+ACTIVITY_EXPONENT = 0.9
+LIKE_EXPONENT = 1.0
+
+# bcrypt hash of "password"
+PASSWORD = '$2b$12$Q1PUFjhN/AWRQ21LbGYvjeLpZZB6lfZ1BPwifHALGO6oIbyC3CmJe'
 
 # Generate random profile image URLs to use for users
 
@@ -32,46 +63,178 @@ image_urls = [
     for i in range(count)
 ]
 
-# Generate random header image URLs to use for users
+email_domains = ['example.com', 'example.net', 'example.org', 'gmail.com', 'yahoo.com', 'hotmail.com']
 
-header_image_urls = [
-    requests.get(f"http://www.splashbase.co/api/v1/images/{i}").json()['url']
-    for i in range(1, 46)
-]
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'header_images.txt')) as images:
+    header_image_urls = images.read().split()
+
+fake = Faker()
+
+
+def chunk_random(params, name, index):
+    """A Random (and the Faker) seeded for chunk `index` of `name`.csv."""
 
-with open('generator/users.csv', 'w') as users_csv:
-    users_writer = csv.DictWriter(users_csv, fieldnames=USERS_CSV_HEADERS)
-    users_writer.writeheader()
+    rng = Random(f"{params['seed']}:{name}:{index}")
+    fake.seed_instance(rng.getrandbits(64))
 
-    for i in range(NUM_USERS):
-        users_writer.writerow(dict(
-            email=fake.email(),
-            username=fake.user_name(),
-            image_url=choice(image_urls),
-            password='$2b$12$Q1PUFjhN/AWRQ21LbGYvjeLpZZB6lfZ1BPwifHALGO6oIbyC3CmJe',
+    return rng
+
+
+def generate_users(params, index, start, stop):
+    """Rows for users `start` to `stop` - 1 (user ids start at 1)."""
+
+    rng = chunk_random(params, 'users', index)
+
+    for user_id in range(start + 1, stop + 1):
+        # usernames and emails must be unique
+        username = f"{fake.user_name()}{user_id}"
+        yield dict(
+            email=f"{username}@{rng.choice(email_domains)}",
+            username=username,
+            image_url=rng.choice(image_urls),
+            password=PASSWORD,
             bio=fake.sentence(),
-            header_image_url=choice(header_image_urls),
+            header_image_url=rng.choice(header_image_urls),
             location=fake.city()
-        ))
+        )
+
+
+def generate_messages(params, index, start, stop):
+    """Rows for messages `start` to `stop` - 1."""
 
-with open('generator/messages.csv', 'w') as messages_csv:
-    messages_writer = csv.DictWriter(messages_csv, fieldnames=MESSAGES_CSV_HEADERS)
-    messages_writer.writeheader()
+    rng = chunk_random(params, 'messages', index)
+    users, step = params['users'], params['activity_step']
 
-    for i in range(NUM_MESSAGES):
-        messages_writer.writerow(dict(
+    for _ in range(start, stop):
+        yield dict(
             text=fake.paragraph()[:MAX_WARBLER_LENGTH],
-            timestamp=get_random_datetime(),
-            user_id=randint(1, NUM_USERS)
-        ))
+            timestamp=get_bursty_datetime(params['bursts'], rng, now=params['now']),
+            user_id=scatter(zipf_rank(users, ACTIVITY_EXPONENT, rng), users, step)
+        )
+
+
+def distinct_targets(count, n, exponent, step, exclude, rng):
+    """Up to `count` different ids from 1 to `n`, drawn by popularity."""
+
+    targets = set()
+    for _ in range(3 * count + 10):
+        if len(targets) >= count:
+            break
+        target = scatter(zipf_rank(n, exponent, rng), n, step)
+        if target != exclude:
+            targets.add(target)
+
+    return targets
+
+
+def generate_follows(params, index, start, stop):
+    """Rows for the users that users `start` to `stop` - 1 follow."""
+
+    rng = chunk_random(params, 'follows', index)
+    users = params['users']
+    mean = params['follows'] / users
+
+    for follower in range(start + 1, stop + 1):
+        count = out_degree(mean, rng, limit=(users - 1) // 2)
+        for followed in distinct_targets(count, users, POPULARITY_EXPONENT,
+                                         params['popularity_step'], follower, rng):
+            yield dict(user_being_followed_id=followed, user_following_id=follower)
+
+
+def generate_likes(params, index, start, stop):
+    """Rows for the messages that users `start` to `stop` - 1 like."""
+
+    rng = chunk_random(params, 'likes', index)
+    messages = params['messages']
+    mean = params['likes'] / params['users']
+
+    for user_id in range(start + 1, stop + 1):
+        count = out_degree(mean, rng, limit=messages // 2)
+        for message_id in distinct_targets(count, messages, LIKE_EXPONENT,
+                                           params['like_step'], None, rng):
+            yield dict(user_id=user_id, message_id=message_id)
+
+
+# file name: (headers, row generator, parameter giving the number of chunked ids)
+TABLES = {
+    'users': (USERS_CSV_HEADERS, generate_users, 'users'),
+    'messages': (MESSAGES_CSV_HEADERS, generate_messages, 'messages'),
+    'follows': (FOLLOWS_CSV_HEADERS, generate_follows, 'users'),
+    'likes': (LIKES_CSV_HEADERS, generate_likes, 'users'),
+}
+
+
+def write_chunk(task):
+    """Write one chunk of a CSV to its own part file. Returns (path, row count)."""
+
+    params, name, index, start, stop = task
+    headers, generate, _ = TABLES[name]
+    path = os.path.join(params['out'], f".{name}.{index:06d}.part")
+    count = 0
+
+    with open(path, 'w', newline='') as part:
+        writer = csv.DictWriter(part, fieldnames=headers)
+        for row in generate(params, index, start, stop):
+            writer.writerow(row)
+            count += 1
+
+    return path, count
+
+
+def write_csv(pool, params, name):
+    """Generate `name`.csv in parallel, joining the parts in order. Returns the row count."""
+
+    headers, _, size = TABLES[name]
+    total = params[size] if params[name] else 0
+    tasks = [(params, name, index, start, min(start + CHUNK_SIZE, total))
+             for index, start in enumerate(range(0, total, CHUNK_SIZE))]
+    count = 0
+
+    with open(os.path.join(params['out'], f"{name}.csv"), 'w', newline='') as out:
+        csv.writer(out).writerow(headers)
+
+        for path, rows in pool.imap(write_chunk, tasks):
+            with open(path, newline='') as part:
+                shutil.copyfileobj(part, out)
+            os.remove(path)
+            count += rows
+
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate Warbler CSVs.")
+    parser.add_argument('--scale', choices=SCALES, default='sample')
+    for name in ('users', 'messages', 'follows', 'likes'):
+        parser.add_argument(f'--{name}', type=int, help=f"number of {name} (overrides --scale)")
+    parser.add_argument('--seed', default='warbler')
+    parser.add_argument('--now', type=datetime.fromisoformat,
+                        default=datetime.now().replace(hour=0, minute=0, second=0, microsecond=0),
+                        help="latest timestamp (default: today's midnight)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--out', default='generator')
+    args = parser.parse_args()
+
+    params = dict(SCALES[args.scale], seed=args.seed, now=args.now, out=args.out)
+    params.update({name: getattr(args, name) for name in ('users', 'messages', 'follows', 'likes')
+                   if getattr(args, name) is not None})
 
-# Generate follows.csv from random pairings of users
+    rng = Random(f"{args.seed}:params")
+    params['popularity_step'] = scatter_step(params['users'], rng)
+    params['activity_step'] = scatter_step(params['users'], rng)
+    params['like_step'] = scatter_step(max(params['messages'], 1), rng)
+    params['bursts'] = [get_random_datetime(now=args.now, rng=rng)
+                        for _ in range(min(max(params['messages'] // 1000, 10), 1000))]
 
-with open('generator/follows.csv', 'w') as follows_csv:
-    all_pairs = list(permutations(range(1, NUM_USERS + 1), 2))
+    os.makedirs(args.out, exist_ok=True)
+
+    with Pool(args.workers) as pool:
+        for name in TABLES:
+            started = perf_counter()
+            count = write_csv(pool, params, name)
+            elapsed = perf_counter() - started
+            print(f"{name}.csv {count:>14,} rows {elapsed:8.2f}s {count / max(elapsed, 1e-9):>12,.0f} rows/s")
 
-    users_writer = csv.DictWriter(follows_csv, fieldnames=FOLLOWS_CSV_HEADERS)
-    users_writer.writeheader()
 
-    for followed_user, follower in sample(all_pairs, NUM_FOLLWERS):
-        users_writer.writerow(dict(user_being_followed_id=followed_user, user_following_id=follower))
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,77 @@
 """Support functions for CSV generation."""
 
-from datetime import datetime
-from random import uniform
+import random
+from datetime import datetime, timedelta
+from math import exp, floor, gcd, log
 
 
-def get_random_datetime(year_gap=2):
+def get_random_datetime(year_gap=2, now=None, rng=random):
     """Get a random datetime within the last few years."""
 
-    now = datetime.now()
+    now = now or datetime.now()
     then = now.replace(year=now.year - year_gap)
-    random_timestamp = uniform(then.timestamp(), now.timestamp())
+    random_timestamp = rng.uniform(then.timestamp(), now.timestamp())
 
     return datetime.fromtimestamp(random_timestamp)
+
+
+def get_bursty_datetime(bursts, rng=random, background=0.2, burst_hours=6, year_gap=2, now=None):
+    """Get a random datetime that is usually shortly after one of `bursts`.
+
+    Real posting comes in bursts around events rather than spread evenly
+    over time: a `background` fraction of datetimes are uniform (as with
+    get_random_datetime), the rest follow a random burst by an
+    exponentially distributed delay averaging `burst_hours`.
+    """
+
+    if not bursts or rng.random() < background:
+        return get_random_datetime(year_gap, now, rng)
+
+    delay = timedelta(hours=rng.expovariate(1 / burst_hours))
+
+    return min(rng.choice(bursts) + delay, now or datetime.now())
+
+
+def zipf_rank(n, exponent, rng=random):
+    """Get a rank from 1 to `n`, with P(rank) roughly proportional to rank ** -exponent.
+
+    Uses the inverse of the continuous approximation's CDF, so it needs no
+    table of weights however large `n` is.
+    """
+
+    u = rng.random()
+
+    if exponent == 1:
+        rank = exp(u * log(n + 1))
+    else:
+        power = 1 - exponent
+        rank = (1 + u * ((n + 1) ** power - 1)) ** (1 / power)
+
+    return min(floor(rank), n)
+
+
+def scatter_step(n, rng=random):
+    """Pick a step for scatter() that visits every id from 1 to `n`."""
+
+    step = rng.randrange(n // 2 + 1, n + 1) if n > 2 else 1
+    while gcd(step, n) != 1:
+        step += 1
+
+    return step
+
+
+def scatter(rank, n, step):
+    """Map ranks 1..`n` one-to-one onto ids 1..`n`, so popular ids aren't all low ids."""
+
+    return rank * step % n + 1
+
+
+def out_degree(mean, rng=random, sigma=1.2, limit=None):
+    """Get a heavy-tailed (lognormal) count averaging about `mean`."""
+
+    if mean <= 0:
+        return 0
+
+    count = round(rng.lognormvariate(log(mean) - sigma ** 2 / 2, sigma))
+
+    return count if limit is None else min(count, limit)
@@ -0,0 +1,38 @@
+"""gunicorn settings for serving wsgi:app.
+
+The app is built once in the master and workers are forked from it
+(preload_app), so imports, template compilation and static fingerprinting
+happen once instead of per worker.
+
+While bcrypt runs in the password pool (BCRYPT_POOL_SIZE, see passwords.py)
+the request thread just waits for it, so with the pool on, workers are
+threaded: a burst of logins ties up some threads while the others keep
+serving pages. GUNICORN_THREADS overrides the default.
+
+Forking a process that has other threads running copies their locks in
+whatever state they were in, so a pool process forked from a gthread
+worker can deadlock on a lock (logging's, the allocator's) that no thread
+in it will ever release. The pool therefore starts its processes with the
+"forkserver" method (POOL_CONTEXT in passwords.py): they are forked from a
+separate server process that has only ever had one thread.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+bcrypt_pool = int(os.environ.get('BCRYPT_POOL_SIZE', 2)) > 0
+threads = int(os.environ.get('GUNICORN_THREADS', 4 if bcrypt_pool else 1))
+worker_class = 'gthread' if threads > 1 else 'sync'
+preload_app = True
+
+
+def post_fork(server, worker):
+    """Don't let workers share database connections opened in the master."""
+
+    from wsgi import app
+    from models import db
+
+    with app.app_context():
+        db.engine.dispose()
@@ -0,0 +1,149 @@
+"""EXPLAIN-based check that the hot-path queries can use their indexes.
+
+Each entry in HOT_PATHS calls the model method one of the main routes
+calls, paired with the index its query is supposed to use. check_indexes()
+records the SQL each call actually sends and EXPLAINs it with sequential
+scans disabled, so the answer is "can the planner use the index" even on a
+small development database where it would happily seq-scan. PostgreSQL
+only.
+"""
+
+from sqlalchemy import event
+
+from models import db, User, Message, Likes, TimelineEntry, has_trigram_search
+
+# any id will do; only the plan shape matters
+SAMPLE_ID = 1
+
+# (description, call that runs the route's queries, index the plans should
+# mention, or a tuple of indexes any of which will do)
+HOT_PATHS = [
+    ("homepage: timeline page",
+     lambda: Message.timeline_page(SAMPLE_ID),
+     'ix_timeline_entries_user_id_timestamp'),
+
+    ("homepage: timeline ETag",
+     lambda: TimelineEntry.page_key(SAMPLE_ID),
+     'ix_timeline_entries_user_id_timestamp'),
+
+    ("homepage: live home feed page",
+     lambda: Message.home_feed_page(SAMPLE_ID),
+     'ix_messages_user_id_timestamp'),
+
+    ("users_show: messages by user",
+     lambda: Message.posted_page(SAMPLE_ID),
+     'ix_messages_user_id_timestamp'),
+
+    ("users_show: newest message",
+     lambda: Message.latest_posted(SAMPLE_ID),
+     'ix_messages_user_id_timestamp'),
+
+    ("is_following: following ids",
+     lambda: User(id=SAMPLE_ID).following_ids,
+     'ix_follows_user_following_id_created_at'),
+
+    ("following_among: followed users on a page",
+     lambda: User(id=SAMPLE_ID).following_among([2, 3]),
+     ('follows_pkey', 'ix_follows_user_following_id_created_at')),
+
+    ("show_following: following page",
+     lambda: User.following_page(SAMPLE_ID),
+     'ix_follows_user_following_id_created_at'),
+
+    ("users_followers: followers page",
+     lambda: User.followers_page(SAMPLE_ID),
+     'ix_follows_user_being_followed_id_created_at'),
+
+    ("is_followed_by: follower ids",
+     lambda: User(id=SAMPLE_ID).follower_ids,
+     ('follows_pkey', 'ix_follows_user_being_followed_id_created_at')),
+
+    ("is_liked: liked message ids",
+     lambda: User(id=SAMPLE_ID).liked_message_ids,
+     ('likes_pkey', 'ix_likes_user_id_created_at')),
+
+    ("liked_among: liked messages on a page",
+     lambda: User(id=SAMPLE_ID).liked_among([2, 3]),
+     ('likes_pkey', 'ix_likes_user_id_created_at')),
+
+    ("show_likes: liked page",
+     lambda: Message.liked_page(SAMPLE_ID),
+     'ix_likes_user_id_created_at'),
+
+    ("messages_destroy: uncount the message's likes",
+     lambda: User.adjust_counts(User.id.in_(db.session
+                                            .query(Likes.user_id)
+                                            .filter(Likes.message_id == SAMPLE_ID)),
+                                likes_count=-1),
+     'ix_likes_message_id'),
+
+    ("list_users: directory page",
+     lambda: User.directory_page(after=SAMPLE_ID),
+     'users_pkey'),
+
+    ("list_users: short search",
+     lambda: User.search("ab"),
+     'ix_users_username_prefix'),
+
+    ("profile header: user by id",
+     lambda: User.query.get(SAMPLE_ID),
+     'users_pkey'),
+]
+
+# only checked where pg_trgm is installed; User.search falls back without it
+TRIGRAM_HOT_PATHS = [
+    ("list_users: search",
+     lambda: User.search("abc"),
+     'ix_users_username_trgm'),
+]
+
+
+def recorded_statements(call):
+    """Run `call` and return the (statement, parameters) it sent to the database."""
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        call()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    return statements
+
+
+def explain(statement, parameters):
+    """Return the planner's EXPLAIN output for a recorded statement, as one string."""
+
+    cursor = db.session.connection().connection.cursor()
+    cursor.execute(f"EXPLAIN {statement}", parameters)
+
+    return "\n".join(row[0] for row in cursor.fetchall())
+
+
+def check_indexes():
+    """EXPLAIN each hot-path call's queries; return a list of (description, index, used, plan)."""
+
+    if db.engine.dialect.name != 'postgresql':
+        raise RuntimeError("check_indexes needs PostgreSQL")
+
+    results = []
+
+    try:
+        db.session.execute("SET LOCAL enable_seqscan = off")
+
+        hot_paths = HOT_PATHS + (TRIGRAM_HOT_PATHS if has_trigram_search() else [])
+
+        for description, call, index in hot_paths:
+            plan = "\n\n".join(explain(statement, parameters)
+                               for statement, parameters in recorded_statements(call))
+            indexes = index if isinstance(index, tuple) else (index,)
+            results.append((description, index, any(name in plan for name in indexes), plan))
+
+    finally:
+        db.session.rollback()
+
+    return results
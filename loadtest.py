@@ -0,0 +1,223 @@
+"""Route-level load test.
+
+    python loadtest.py --scale 10k --workers 8 --duration 60
+    python loadtest.py --duration 30 --baseline loadtest-1a2b3c4.json
+
+Optionally generates and seeds a dataset (--scale, using
+generator/create_csvs.py and seed.py), then has --workers threads, each
+logged in as a different user, replay a weighted mix of requests against
+the app for --duration seconds. Prints p50/p95/p99 latency, throughput and
+SQL statements per request (from the X-Query-Count header) for each route,
+and saves them as JSON, named after the current commit, so runs can be
+compared with --baseline.
+
+Without --scale it uses whatever data is already in the database. Requests
+go through the app in-process (Flask's test client), so the numbers leave
+out the WSGI server and network but include everything from routing to
+the database.
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+from collections import defaultdict
+from datetime import datetime
+from statistics import mean, quantiles
+from time import perf_counter
+
+import seed as seeder
+from app import CURR_USER_KEY, create_app
+from models import db, User, Message
+
+# relative weights of the scenarios below
+MIX = {
+    'homepage': 40,
+    'users_show': 20,
+    'list_users': 10,
+    'like': 10,
+    'follow': 10,
+    'messages_add': 5,
+    'messages_show': 5,
+}
+
+SEARCH_TERMS = ['a', 'an', 'jo', 'mar', 'son', 'smith', 'zz']
+
+
+class Worker(threading.Thread):
+    """Replays the request mix as one logged-in user, recording each response."""
+
+    def __init__(self, app, user_id, data, deadline, seed):
+        super().__init__(daemon=True)
+        self.client = app.test_client()
+        self.user_id = user_id
+        self.data = data
+        self.deadline = deadline
+        self.rng = random.Random(seed)
+        # route: [(seconds, status, sql count)]
+        self.results = defaultdict(list)
+
+        with self.client.session_transaction() as sess:
+            sess[CURR_USER_KEY] = user_id
+
+    def request(self, route, method, url, **kwargs):
+        started = perf_counter()
+        res = self.client.open(url, method=method, **kwargs)
+        elapsed = perf_counter() - started
+
+        sql = res.headers.get('X-Query-Count')
+        self.results[route].append((elapsed, res.status_code, int(sql) if sql else None))
+
+    def run(self):
+        rng, data = self.rng, self.data
+        scenarios, weights = zip(*MIX.items())
+
+        while perf_counter() < self.deadline:
+            scenario = rng.choices(scenarios, weights)[0]
+
+            if scenario == 'homepage':
+                self.request('homepage', 'GET', '/')
+            elif scenario == 'users_show':
+                self.request('users_show', 'GET', f"/users/{rng.randint(1, data['users'])}")
+            elif scenario == 'list_users':
+                self.request('list_users', 'GET', f"/users?q={rng.choice(SEARCH_TERMS)}")
+            elif scenario == 'messages_show':
+                self.request('messages_show', 'GET', f"/messages/{rng.randint(1, data['messages'])}")
+            elif scenario == 'like':
+                message_id = rng.randint(1, data['messages'])
+                self.request('api_like', 'POST', f"/api/likes/{message_id}")
+                self.request('api_unlike', 'DELETE', f"/api/likes/{message_id}")
+            elif scenario == 'follow':
+                other_id = rng.randint(1, data['users'])
+                if other_id != self.user_id:
+                    self.request('api_follow', 'POST', f"/api/follows/{other_id}")
+                    self.request('api_unfollow', 'DELETE', f"/api/follows/{other_id}")
+            elif scenario == 'messages_add':
+                self.request('messages_add', 'POST', "/messages/new",
+                             data={'text': f"load test {rng.random()}"})
+
+
+def summarize(samples, duration):
+    """Latency percentiles (ms), throughput and SQL counts for one route's samples."""
+
+    times = sorted(seconds * 1000 for seconds, _, _ in samples)
+    cuts = quantiles(times, n=100, method='inclusive') if len(times) > 1 else times * 99
+    sql = [count for _, _, count in samples if count is not None]
+
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, status, _ in samples if status >= 500),
+        'rps': round(len(samples) / duration, 1),
+        'p50_ms': round(cuts[49], 2),
+        'p95_ms': round(cuts[94], 2),
+        'p99_ms': round(cuts[98], 2),
+        'max_ms': round(times[-1], 2),
+        'sql_mean': round(mean(sql), 1) if sql else None,
+        'sql_max': max(sql) if sql else None,
+    }
+
+
+def seed_dataset(scale, seed):
+    """Generate (once) and load the CSVs for `scale`."""
+
+    directory = os.path.join('generator', 'data', f"{scale}-{seed}")
+
+    if not os.path.exists(os.path.join(directory, 'users.csv')):
+        subprocess.run([sys.executable, 'generator/create_csvs.py', '--scale', scale,
+                        '--seed', str(seed), '--out', directory], check=True)
+
+    seeder.seed(directory)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test Warbler's routes.")
+    parser.add_argument('--scale', help="generate and seed this dataset first (see generator/create_csvs.py)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30, help="seconds")
+    parser.add_argument('--config', default='production', help="config profile (see config.py)")
+    parser.add_argument('--output', help="JSON file for the results (default: loadtest-<commit>.json)")
+    parser.add_argument('--baseline', help="earlier results to compare against")
+    args = parser.parse_args()
+
+    app = create_app(args.config)
+    app.config.update(WTF_CSRF_ENABLED=False,
+                      # report X-Query-Count on every response without failing any
+                      SQL_QUERY_BUDGET=sys.maxsize, SQL_QUERY_BUDGET_STRICT=False)
+
+    with app.app_context():
+        if args.scale:
+            seed_dataset(args.scale, args.seed)
+
+        data = {'users': User.query.count(), 'messages': Message.query.count()}
+        user_ids = [user_id for (user_id,) in
+                    User.query.with_entities(User.id).order_by(db.func.random()).limit(args.workers)]
+        db.session.remove()
+
+    if not user_ids:
+        parser.error("the database is empty; pass --scale to seed it")
+
+    deadline = perf_counter() + args.duration
+    workers = [Worker(app, user_ids[i % len(user_ids)], data, deadline, args.seed * 1000 + i)
+               for i in range(args.workers)]
+    started = perf_counter()
+
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    duration = perf_counter() - started
+    samples = defaultdict(list)
+    for worker in workers:
+        for route, results in worker.results.items():
+            samples[route].extend(results)
+
+    routes = {route: summarize(results, duration) for route, results in sorted(samples.items())}
+    report = {
+        'commit': git_commit(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'config': args.config,
+        'scale': args.scale,
+        'data': data,
+        'workers': args.workers,
+        'duration': round(duration, 1),
+        'requests': sum(route['requests'] for route in routes.values()),
+        'rps': round(sum(route['rps'] for route in routes.values()), 1),
+        'routes': routes,
+    }
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['routes']
+
+    print(f"{'route':<16}{'reqs':>8}{'err':>6}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'sql':>7}"
+          + ("  p95 vs baseline" if baseline else ""))
+    for name, route in routes.items():
+        line = (f"{name:<16}{route['requests']:>8}{route['errors']:>6}{route['rps']:>8}"
+                f"{route['p50_ms']:>9}{route['p95_ms']:>9}{route['p99_ms']:>9}{route['sql_mean'] or '-':>7}")
+        if name in baseline:
+            line += f"  {route['p95_ms'] / baseline[name]['p95_ms'] - 1:+.0%}"
+        print(line)
+    print(f"{report['requests']} requests in {report['duration']}s, {report['rps']} req/s")
+
+    output = args.output or f"loadtest-{report['commit']}.json"
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"saved {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""Micro-benchmarks for the model methods on hot paths.
+
+    python microbench.py
+    python microbench.py --sizes 10,1000,100000 --json microbench.json
+
+For each size, builds a user who follows, is followed by, and likes that
+many users and messages, then times the per-row helpers templates call
+(is_following, is_followed_by, is_liked: one call per row of a 20-row
+page), their batched alternatives, User.authenticate and the feed
+queries. Each is run on a fresh request's worth of state (empty identity
+map, no cached ID sets), and reported with its median time and the peak
+memory it allocated (tracemalloc). A per-row helper whose cost grows with
+the size is an O(n) regression.
+
+It drops and recreates the tables of the configured database, so it uses
+the testing profile (warbler-test) unless told otherwise.
+"""
+
+import argparse
+import json
+import tracemalloc
+from statistics import median
+from time import perf_counter
+
+from app import create_app
+from models import db, User, Message, Follows, Likes, TimelineEntry
+
+SIZES = [10, 100, 1000, 10000, 100000]
+
+# rows on a page of users or messages
+PAGE = 20
+
+# run each benchmark for about this long (seconds), at least MIN_RUNS times
+TARGET_TIME = 0.2
+MIN_RUNS = 3
+
+
+def populate(size):
+    """Make user 1 follow, be followed by, and like `size` others. Returns user 1's id."""
+
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+
+    subject = User.signup("subject", "subject@test.com", "password", None)
+    db.session.commit()
+
+    others = range(subject.id + 1, subject.id + size + 1)
+    db.session.execute(User.__table__.insert(), [
+        dict(id=id, username=f"user{id}", email=f"user{id}@test.com", password="-")
+        for id in others])
+    db.session.execute(Follows.__table__.insert(), [
+        dict(user_being_followed_id=id, user_following_id=subject.id) for id in others] + [
+        dict(user_being_followed_id=subject.id, user_following_id=id) for id in others])
+    db.session.execute(Message.__table__.insert(), [
+        dict(id=id, text=f"message {id}", user_id=id) for id in others])
+    db.session.execute(Likes.__table__.insert(), [
+        dict(user_id=subject.id, message_id=id) for id in others])
+    TimelineEntry.rebuild(subject.id)
+    User.reconcile_counts()
+    Message.reconcile_counts()
+    db.session.commit()
+
+    return subject.id
+
+
+def benchmarks(user_id, size):
+    """name: function to time, for the subject of populate(size)."""
+
+    page = list(range(user_id + 1, user_id + min(PAGE, size) + 1))
+
+    def per_row(method):
+        def run():
+            user = User.query.get(user_id)
+            for id in page:
+                method(user, id)
+        return run
+
+    return {
+        'is_following x20': per_row(lambda user, id: user.is_following(User.query.get(id))),
+        'is_followed_by x20': per_row(lambda user, id: user.is_followed_by(User.query.get(id))),
+        'is_liked x20': per_row(lambda user, id: user.is_liked(id)),
+        'following_among': lambda: User.query.get(user_id).following_among(page),
+        'liked_among': lambda: User.query.get(user_id).liked_among(page),
+        'authenticate': lambda: User.authenticate("subject", "password"),
+        'timeline_page': lambda: Message.timeline_page(user_id),
+        'home_feed_page': lambda: Message.home_feed_page(user_id),
+        'liked_page': lambda: Message.liked_page(user_id),
+        'following_page': lambda: User.following_page(user_id),
+        'followers_page': lambda: User.followers_page(user_id),
+    }
+
+
+def measure(fn):
+    """(median ms, peak KiB allocated) for `fn`, each run from an empty session."""
+
+    times = []
+    started = perf_counter()
+
+    while len(times) < MIN_RUNS or perf_counter() - started < TARGET_TIME:
+        db.session.expunge_all()
+        run_started = perf_counter()
+        fn()
+        times.append((perf_counter() - run_started) * 1000)
+
+    db.session.expunge_all()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return median(times), peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Warbler's model hot paths.")
+    parser.add_argument('--sizes', type=lambda s: [int(n) for n in s.split(',')], default=SIZES,
+                        help="comma-separated numbers of follows/likes (default: %(default)s)")
+    parser.add_argument('--config', default='testing', help="config profile (see config.py)")
+    parser.add_argument('--json', help="also save the results to this file")
+    args = parser.parse_args()
+
+    app = create_app(args.config)
+    results = {}
+
+    with app.app_context():
+        for size in args.sizes:
+            user_id = populate(size)
+            for name, fn in benchmarks(user_id, size).items():
+                results.setdefault(name, {})[size] = measure(fn)
+            db.session.remove()
+
+        db.drop_all()
+
+    print(f"{'ms / peak KiB':<20}" + "".join(f"{size:>18,}" for size in args.sizes) + "   growth")
+    for name, by_size in results.items():
+        cells = "".join(f"{ms:>9.2f} /{kib:>7.0f}" for ms, kib in by_size.values())
+        first, last = by_size[args.sizes[0]][0], by_size[args.sizes[-1]][0]
+        print(f"{name:<20}{cells}   x{last / first:.1f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({name: {size: {'ms': round(ms, 3), 'peak_kib': round(kib, 1)}
+                              for size, (ms, kib) in by_size.items()}
+                       for name, by_size in results.items()}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
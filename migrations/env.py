@@ -0,0 +1,63 @@
+"""Alembic environment for Warbler.
+
+Uses the Flask app's database (set up by connect_db) and the models'
+metadata, so `alembic revision --autogenerate` compares against models.py.
+"""
+
+from logging.config import fileConfig
+
+from alembic import context
+
+from wsgi import app
+from models import db, SEARCH_INDEXES
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = db.metadata
+
+# indexes that migrations manage but models.py deliberately doesn't declare
+UNMANAGED_INDEXES = set(SEARCH_INDEXES)
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    """Keep autogenerate from dropping indexes in UNMANAGED_INDEXES."""
+
+    return not (type_ == 'index' and name in UNMANAGED_INDEXES)
+
+
+def run_migrations_offline():
+    """Emit migration SQL as a script instead of running it."""
+
+    context.configure(
+        url=app.config['SQLALCHEMY_DATABASE_URI'],
+        target_metadata=target_metadata,
+        include_object=include_object,
+        literal_binds=True,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    """Run migrations against the app's database."""
+
+    with app.app_context():
+        with db.engine.connect() as connection:
+            context.configure(
+                connection=connection,
+                target_metadata=target_metadata,
+                include_object=include_object,
+            )
+
+            with context.begin_transaction():
+                context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
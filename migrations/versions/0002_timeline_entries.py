@@ -0,0 +1,52 @@
+"""Materialized home timelines
+
+Adds timeline_entries, one row per message in each user's home timeline,
+and fills it from the messages and follows tables: every user gets their
+own messages plus those of everyone they follow.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'timeline_entries',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('message_id', sa.Integer(), nullable=False),
+        sa.Column('author_id', sa.Integer(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['author_id'], ['users.id'], ondelete='cascade'),
+        sa.ForeignKeyConstraint(['message_id'], ['messages.id'], ondelete='cascade'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='cascade'),
+        sa.PrimaryKeyConstraint('user_id', 'message_id'),
+    )
+
+    # same as TimelineEntry.backfill(); self-follows would duplicate own messages
+    op.execute("""
+        INSERT INTO timeline_entries (user_id, message_id, author_id, timestamp)
+        SELECT user_id, id, user_id, timestamp FROM messages
+        UNION ALL
+        SELECT follows.user_following_id, messages.id, messages.user_id, messages.timestamp
+        FROM follows JOIN messages ON messages.user_id = follows.user_being_followed_id
+        WHERE follows.user_following_id <> follows.user_being_followed_id
+    """)
+
+    # the table is new, so there are no writes for a plain build to block
+    op.create_index('ix_timeline_entries_user_id_timestamp', 'timeline_entries',
+                    ['user_id', 'timestamp', 'message_id'])
+
+
+def downgrade():
+    op.drop_index('ix_timeline_entries_user_id_timestamp', table_name='timeline_entries')
+    op.drop_table('timeline_entries')
@@ -0,0 +1,42 @@
+"""Denormalized counts on users
+
+Adds users.messages_count, followers_count, following_count and
+likes_count, and fills them in from the messages, follows and likes
+tables (as User.reconcile_counts() does).
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+# column: (table, column holding the user's id)
+COUNTERS = {
+    'messages_count': ('messages', 'user_id'),
+    'followers_count': ('follows', 'user_being_followed_id'),
+    'following_count': ('follows', 'user_following_id'),
+    'likes_count': ('likes', 'user_id'),
+}
+
+
+def upgrade():
+    for column in COUNTERS:
+        op.add_column('users', sa.Column(column, sa.Integer(),
+                                         server_default='0', nullable=False))
+
+    op.execute("UPDATE users SET " + ", ".join(
+        f"{column} = (SELECT count(*) FROM {table} WHERE {table}.{user_column} = users.id)"
+        for column, (table, user_column) in COUNTERS.items()))
+
+
+def downgrade():
+    for column in reversed(list(COUNTERS)):
+        op.drop_column('users', column)
@@ -0,0 +1,40 @@
+"""Indexes for hot access paths
+
+- messages(user_id, timestamp): profile pages and the live home feed
+- follows(user_following_id): "who does this user follow"; the primary
+  key leads with user_being_followed_id so it can't serve this
+- likes(user_id): a user's likes
+
+On PostgreSQL the indexes are built CONCURRENTLY, outside a transaction,
+so they can be added to a live database without locking out writes.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_messages_user_id_timestamp', 'messages', ['user_id', 'timestamp']),
+    ('ix_follows_user_following_id', 'follows', ['user_following_id']),
+    ('ix_likes_user_id', 'likes', ['user_id']),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
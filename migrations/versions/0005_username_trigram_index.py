@@ -0,0 +1,48 @@
+"""Trigram index for username search
+
+Adds a pg_trgm GIN index on users.username so the ILIKE '%term%' search
+in User.search is an index scan instead of a sequential scan. If the
+pg_trgm extension isn't available on the server the index is skipped and
+User.search falls back to ranking LIKE matches in-process.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+# kept out of models.py since it only exists where pg_trgm does
+INDEX_NAME = 'ix_users_username_trgm'
+
+
+def trigram_available(bind):
+    return bind.dialect.name == 'postgresql' and bind.execute(
+        "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'").scalar()
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    if not trigram_available(bind):
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    with op.get_context().autocommit_block():
+        op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} "
+                   "ON users USING gin (username gin_trgm_ops)")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    with op.get_context().autocommit_block():
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}")
@@ -0,0 +1,50 @@
+"""Record when follows were made
+
+Adds follows.created_at (existing follows get the migration time, in UTC
+like new ones) and replaces the user_following_id index with (user,
+created_at) indexes for both directions, so follower/following lists can
+be paged newest first.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_follows_user_following_id_created_at', 'follows',
+     ['user_following_id', 'created_at', 'user_being_followed_id']),
+    ('ix_follows_user_being_followed_id_created_at', 'follows',
+     ['user_being_followed_id', 'created_at', 'user_following_id']),
+]
+
+
+def upgrade():
+    op.add_column('follows', sa.Column('created_at', sa.DateTime(),
+                                       server_default=sa.text("timezone('utc', now())"), nullable=False))
+
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+
+        op.drop_index('ix_follows_user_following_id', table_name='follows',
+                      postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_follows_user_following_id', 'follows', ['user_following_id'],
+                        postgresql_concurrently=True)
+
+        for name, table, columns in INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
+
+    op.drop_column('follows', 'created_at')
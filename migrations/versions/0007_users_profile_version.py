@@ -0,0 +1,24 @@
+"""Version users' profiles for cache invalidation
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('profile_version', sa.Integer(),
+                                     server_default='0', nullable=False))
+
+
+def downgrade():
+    op.drop_column('users', 'profile_version')
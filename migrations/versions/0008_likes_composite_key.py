@@ -0,0 +1,76 @@
+"""Key likes on (user_id, message_id) and count likes per message
+
+Replaces likes' surrogate id with a (user_id, message_id) primary key and
+drops the unique constraint on message_id, which only ever let one user
+like a message. Adds likes.created_at (existing likes get the migration
+time, in UTC), indexes for a user's likes newest first and for a message's
+likers, and messages.likes_count, filled in from the likes table.
+
+Downgrading keeps only the earliest like of each message.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_likes_user_id_created_at', 'likes', ['user_id', 'created_at', 'message_id']),
+    ('ix_likes_message_id', 'likes', ['message_id']),
+]
+
+
+def upgrade():
+    # the old columns were nullable; a like without both can't be keyed
+    op.execute("DELETE FROM likes WHERE user_id IS NULL OR message_id IS NULL")
+
+    op.add_column('likes', sa.Column('created_at', sa.DateTime(),
+                                     server_default=sa.text("timezone('utc', now())"), nullable=False))
+    op.drop_constraint('likes_pkey', 'likes', type_='primary')
+    op.drop_constraint('likes_message_id_key', 'likes', type_='unique')
+    op.drop_column('likes', 'id')
+    op.create_primary_key('likes_pkey', 'likes', ['user_id', 'message_id'])
+
+    op.add_column('messages', sa.Column('likes_count', sa.Integer(),
+                                        server_default='0', nullable=False))
+    op.execute("""
+        UPDATE messages SET likes_count = counts.likes
+        FROM (SELECT message_id, count(*) AS likes FROM likes GROUP BY message_id) AS counts
+        WHERE messages.id = counts.message_id
+    """)
+
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+
+        op.drop_index('ix_likes_user_id', table_name='likes', postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_likes_user_id', 'likes', ['user_id'], postgresql_concurrently=True)
+
+        for name, table, columns in INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
+
+    op.drop_column('messages', 'likes_count')
+
+    op.execute("""
+        DELETE FROM likes AS later USING likes AS first
+        WHERE later.message_id = first.message_id
+          AND (later.created_at, later.user_id) > (first.created_at, first.user_id)
+    """)
+    op.drop_constraint('likes_pkey', 'likes', type_='primary')
+    op.execute("ALTER TABLE likes ADD COLUMN id SERIAL PRIMARY KEY")
+    op.alter_column('likes', 'user_id', nullable=True)
+    op.alter_column('likes', 'message_id', nullable=True)
+    op.create_unique_constraint('likes_message_id_key', 'likes', ['message_id'])
+    op.drop_column('likes', 'created_at')
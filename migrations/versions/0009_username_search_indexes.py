@@ -0,0 +1,61 @@
+"""Username search indexes the LIMIT can stop early on
+
+Swaps the GIN trigram index from 0005 for a GiST one, which serves
+`ORDER BY username <-> term` as a nearest-neighbour scan so User.search
+stops after `limit` rows instead of ranking every match. Also adds a
+"C"-collated index on lower(username) for terms too short to have
+trigrams, which User.search sends through a prefix LIKE.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+
+
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+# both kept out of models.py; see UNMANAGED_INDEXES in env.py
+TRIGRAM_INDEX = 'ix_users_username_trgm'
+PREFIX_INDEX = 'ix_users_username_prefix'
+
+
+def trigram_available(bind):
+    return bind.dialect.name == 'postgresql' and bind.execute(
+        "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'").scalar()
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    if bind.dialect.name != 'postgresql':
+        return
+
+    with op.get_context().autocommit_block():
+        op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {PREFIX_INDEX} "
+                   "ON users ((lower(username)) COLLATE \"C\")")
+
+        if trigram_available(bind):
+            op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {TRIGRAM_INDEX}")
+            op.execute(f"CREATE INDEX CONCURRENTLY {TRIGRAM_INDEX} "
+                       "ON users USING gist (username gist_trgm_ops)")
+
+
+def downgrade():
+    bind = op.get_bind()
+
+    if bind.dialect.name != 'postgresql':
+        return
+
+    with op.get_context().autocommit_block():
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {PREFIX_INDEX}")
+
+        if trigram_available(bind):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {TRIGRAM_INDEX}")
+            op.execute(f"CREATE INDEX CONCURRENTLY {TRIGRAM_INDEX} "
+                       "ON users USING gin (username gin_trgm_ops)")
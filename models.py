@@ -1,12 +1,69 @@
 """SQLAlchemy models for Warbler."""
 
+import re
 from datetime import datetime
 
-from flask_bcrypt import Bcrypt
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import select, literal, tuple_, func, or_, and_
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.orm import joinedload
 
-bcrypt = Bcrypt()
-db = SQLAlchemy()
+from passwords import AppHasher
+from replicas import RoutingSQLAlchemy
+
+hasher = AppHasher()
+db = RoutingSQLAlchemy()
+
+class utc_now(FunctionElement):
+    """The database's current time in UTC, whatever the server's time zone.
+
+    The server default for timestamps the app otherwise sets with
+    datetime.utcnow, so rows written outside the ORM (COPY, migrations)
+    use the same clock.
+    """
+
+    name = 'utc_now'
+
+
+@compiles(utc_now)
+def compile_utc_now(element, compiler, **kw):
+    # already UTC on SQLite
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(utc_now, 'postgresql')
+def compile_utc_now_postgresql(element, compiler, **kw):
+    return "timezone('utc', now())"
+
+
+FEED_PAGE_SIZE = 100
+SEARCH_RESULTS_LIMIT = 50
+DIRECTORY_PAGE_SIZE = 24
+DIRECTORY_MAX_PAGE_SIZE = 100
+FOLLOWS_PAGE_SIZE = 60
+
+# how many LIKE matches the in-process search fallback will rank
+SEARCH_FALLBACK_SCAN = 1000
+
+# search terms shorter than this have no trigrams to narrow the search
+# with, so they match username prefixes instead
+SEARCH_MIN_TRIGRAM_LENGTH = 3
+
+# username search indexes models.py can't declare (an expression index and
+# a pg_trgm operator class); migrations and create_search_indexes() make them
+SEARCH_INDEXES = {
+    'ix_users_username_prefix':
+        'CREATE INDEX IF NOT EXISTS ix_users_username_prefix '
+        'ON users ((lower(username)) COLLATE "C")',
+    'ix_users_username_trgm':
+        'CREATE INDEX IF NOT EXISTS ix_users_username_trgm '
+        'ON users USING gist (username gist_trgm_ops)',
+}
+
+# stored as plain /static/ paths; templates fingerprint them with |static_url
+DEFAULT_IMAGE_URL = "/static/images/default-pic.png"
+DEFAULT_HEADER_IMAGE_URL = "/static/images/warbler-hero.jpg"
 
 
 class Follows(db.Model):
@@ -26,30 +83,125 @@ class Follows(db.Model):
         primary_key=True,
     )
 
+    created_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=datetime.utcnow,
+        server_default=utc_now(),
+    )
+
+    # the primary key leads with user_being_followed_id, so "who does this
+    # user follow" needs its own index; both directions are listed newest
+    # follow first
+    __table_args__ = (
+        db.Index('ix_follows_user_following_id_created_at',
+                 'user_following_id', 'created_at', 'user_being_followed_id'),
+        db.Index('ix_follows_user_being_followed_id_created_at',
+                 'user_being_followed_id', 'created_at', 'user_following_id'),
+    )
+
+    @classmethod
+    def add(cls, user_following_id, user_being_followed_id):
+        """Follow a user, unless already following. Returns whether a row was added.
+
+        One INSERT that ignores duplicates (see insert_or_ignore), so it
+        costs the same however many users either side follows, and
+        repeating it is harmless.
+        """
+
+        result = db.session.execute(insert_or_ignore(
+            cls.__table__,
+            user_following_id=user_following_id,
+            user_being_followed_id=user_being_followed_id,
+        ))
+
+        return result.rowcount == 1
+
+    @classmethod
+    def remove(cls, user_following_id, user_being_followed_id):
+        """Stop following a user. Returns whether a row was deleted."""
+
+        return cls.query.filter(
+            cls.user_following_id == user_following_id,
+            cls.user_being_followed_id == user_being_followed_id,
+        ).delete(synchronize_session=False) == 1
+
 
 class Likes(db.Model):
     """Mapping user likes to warbles."""
 
     __tablename__ = 'likes' 
 
-    id = db.Column(
-        db.Integer,
-        primary_key=True
-    )
-
     user_id = db.Column(
         db.Integer,
-        db.ForeignKey('users.id', ondelete='cascade')
+        db.ForeignKey('users.id', ondelete='cascade'),
+        primary_key=True,
     )
 
     message_id = db.Column(
         db.Integer,
         db.ForeignKey('messages.id', ondelete='cascade'),
-        unique=True
+        primary_key=True,
+    )
+
+    created_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=datetime.utcnow,
+        server_default=utc_now(),
+    )
+
+    # the primary key answers "does this user like these messages"; a
+    # user's likes are listed newest like first, and "who liked this"
+    # needs message_id leading
+    __table_args__ = (
+        db.Index('ix_likes_user_id_created_at', 'user_id', 'created_at', 'message_id'),
+        db.Index('ix_likes_message_id', 'message_id'),
     )
 
+    @classmethod
+    def add(cls, user_id, message_id):
+        """Like a message, unless it's already liked. Returns whether a row was added."""
+
+        result = db.session.execute(insert_or_ignore(
+            cls.__table__,
+            user_id=user_id,
+            message_id=message_id,
+        ))
+
+        return result.rowcount == 1
+
+    @classmethod
+    def remove(cls, user_id, message_id):
+        """Unlike a message. Returns whether a row was deleted."""
+
+        return cls.query.filter(
+            cls.user_id == user_id,
+            cls.message_id == message_id,
+        ).delete(synchronize_session=False) == 1
+
 
-class User(db.Model):
+class CounterMixin:
+    """Denormalized *_count columns, kept up to date with adjust_counts()."""
+
+    @classmethod
+    def adjust_counts(cls, row, **deltas):
+        """Atomically add `deltas` to counter columns, e.g. followers_count=1.
+
+        `row` is an id or a SQL criterion selecting several rows. The
+        change is made with a single UPDATE in the current transaction.
+        """
+
+        criterion = cls.id == row if isinstance(row, int) else row
+
+        (cls.query
+            .filter(criterion)
+            .update({getattr(cls, name): getattr(cls, name) + delta
+                     for name, delta in deltas.items()},
+                    synchronize_session=False))
+
+
+class User(CounterMixin, db.Model):
     """User in the system."""
 
     __tablename__ = 'users'
@@ -73,12 +225,12 @@ class User(db.Model):
 
     image_url = db.Column(
         db.Text,
-        default="/static/images/default-pic.png",
+        default=DEFAULT_IMAGE_URL,
     )
 
     header_image_url = db.Column(
         db.Text,
-        default="/static/images/warbler-hero.jpg"
+        default=DEFAULT_HEADER_IMAGE_URL,
     )
 
     bio = db.Column(
@@ -94,47 +246,296 @@ class User(db.Model):
         nullable=False,
     )
 
-    messages = db.relationship('Message')
+    # Denormalized counts for the profile stats, kept in step by the write
+    # routes (see adjust_counts) and repaired by reconcile_counts.
+
+    messages_count = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0,
+        server_default='0',
+    )
+
+    followers_count = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0,
+        server_default='0',
+    )
+
+    following_count = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0,
+        server_default='0',
+    )
+
+    likes_count = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0,
+        server_default='0',
+    )
+
+    # bumped whenever the profile fields shown next to messages change, so
+    # caches of rendered messages can tell they're stale
+    profile_version = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0,
+        server_default='0',
+    )
+
+    # Deleting a user leaves their messages to the database's ON DELETE
+    # CASCADE instead of loading them all to null out user_id.
+    messages = db.relationship('Message', cascade='all, delete-orphan', passive_deletes=True)
 
     followers = db.relationship(
         "User",
         secondary="follows",
         primaryjoin=(Follows.user_being_followed_id == id),
-        secondaryjoin=(Follows.user_following_id == id)
+        secondaryjoin=(Follows.user_following_id == id),
+        passive_deletes=True,
     )
 
     following = db.relationship(
         "User",
         secondary="follows",
         primaryjoin=(Follows.user_following_id == id),
-        secondaryjoin=(Follows.user_being_followed_id == id)
+        secondaryjoin=(Follows.user_being_followed_id == id),
+        passive_deletes=True,
     )
 
     likes = db.relationship(
         'Message',
-        secondary="likes"
+        secondary="likes",
+        passive_deletes=True,
     )
 
     def __repr__(self):
         return f"<User #{self.id}: {self.username}, {self.email}>"
 
+    @property
+    def follower_ids(self):
+        """IDs of the users following this user."""
+
+        return self._id_set('_follower_ids', db.session
+            .query(Follows.user_following_id)
+            .filter(Follows.user_being_followed_id == self.id))
+
+    @property
+    def following_ids(self):
+        """IDs of the users this user is following."""
+
+        return self._id_set('_following_ids', db.session
+            .query(Follows.user_being_followed_id)
+            .filter(Follows.user_following_id == self.id))
+
+    @property
+    def liked_message_ids(self):
+        """IDs of the messages this user likes."""
+
+        return self._id_set('_liked_message_ids', db.session
+            .query(Likes.message_id)
+            .filter(Likes.user_id == self.id))
+
+    def _id_set(self, name, query):
+        """Run an ID-only `query` once and keep the result as a set on this user.
+
+        The set lives as long as this instance does, which for g.user is one
+        request. Call clear_id_sets() after changing follows or likes.
+        """
+
+        if name not in self.__dict__:
+            self.__dict__[name] = {id for (id,) in query}
+
+        return self.__dict__[name]
+
+    def clear_id_sets(self):
+        """Forget cached follower/following/liked IDs so they're re-queried."""
+
+        for name in ('_follower_ids', '_following_ids', '_liked_message_ids'):
+            self.__dict__.pop(name, None)
+
+    def following_among(self, user_ids):
+        """The subset of `user_ids` this user follows, in one query.
+
+        For a page of people this beats building following_ids when the
+        user follows far more people than are on the page.
+        """
+
+        if not user_ids:
+            return set()
+
+        return {id for (id,) in db.session
+                .query(Follows.user_being_followed_id)
+                .filter(Follows.user_following_id == self.id,
+                        Follows.user_being_followed_id.in_(user_ids))}
+
+    def liked_among(self, message_ids):
+        """The subset of `message_ids` this user likes, in one query."""
+
+        if not message_ids:
+            return set()
+
+        return {id for (id,) in db.session
+                .query(Likes.message_id)
+                .filter(Likes.user_id == self.id,
+                        Likes.message_id.in_(message_ids))}
+
     def is_followed_by(self, other_user):
         """Is this user followed by `other_user`?"""
 
-        found_user_list = [user for user in self.followers if user == other_user]
-        return len(found_user_list) == 1
+        return other_user.id in self.follower_ids
 
     def is_following(self, other_user):
         """Is this user following `other_user`?"""
 
-        found_user_list = [user for user in self.following if user == other_user]
-        return len(found_user_list) == 1
+        return other_user.id in self.following_ids
     
     def is_liked(self, message_id):
         """Does this user currently like this message?"""
 
-        does_user_like = [like for like in self.likes if like.id == message_id]
-        return len(does_user_like) == 1
+        return message_id in self.liked_message_ids
+
+    @classmethod
+    def reconcile_counts(cls, criterion=None):
+        """Recompute the counter columns from the messages, follows and likes tables.
+
+        Only users whose stored counts have drifted are updated (optionally
+        limited by `criterion`). Returns how many users were fixed.
+        """
+
+        def count_where(table, whereclause):
+            return select([func.count()]).select_from(table).where(whereclause).as_scalar()
+
+        actual = {
+            cls.messages_count: count_where(Message.__table__, Message.user_id == cls.id),
+            cls.followers_count: count_where(Follows.__table__, Follows.user_being_followed_id == cls.id),
+            cls.following_count: count_where(Follows.__table__, Follows.user_following_id == cls.id),
+            cls.likes_count: count_where(Likes.__table__, Likes.user_id == cls.id),
+        }
+
+        query = cls.query.filter(or_(*[column != count for column, count in actual.items()]))
+
+        if criterion is not None:
+            query = query.filter(criterion)
+
+        return query.update(actual, synchronize_session=False)
+
+    @classmethod
+    def directory_query(cls):
+        """Query for just the columns the /users directory shows.
+
+        Rows are lightweight (id, username, image_url, header_image_url,
+        bio) tuples rather than full User objects with password hashes.
+        """
+
+        return cls.query.with_entities(
+            cls.id,
+            cls.username,
+            cls.image_url,
+            cls.header_image_url,
+            cls.bio,
+        )
+
+    @classmethod
+    def directory_page(cls, after=None, per_page=DIRECTORY_PAGE_SIZE):
+        """A page of directory rows in id order, starting after user `after`.
+
+        Returns (rows, next_after); next_after is None on the last page.
+        """
+
+        query = cls.directory_query()
+
+        if after is not None:
+            query = query.filter(cls.id > after)
+
+        rows = query.order_by(cls.id).limit(per_page + 1).all()
+
+        if len(rows) > per_page:
+            rows = rows[:per_page]
+            return rows, rows[-1].id
+
+        return rows, None
+
+    @classmethod
+    def following_page(cls, user_id, before=None, limit=FOLLOWS_PAGE_SIZE):
+        """A page of directory rows for the users `user_id` follows, newest follow first."""
+
+        query = (cls.directory_query()
+                 .add_columns(Follows.created_at)
+                 .join(Follows, Follows.user_being_followed_id == cls.id)
+                 .filter(Follows.user_following_id == user_id))
+
+        return keyset_page(query, Follows.created_at, Follows.user_being_followed_id,
+                           before, limit, row_key=lambda row: (row.created_at, row.id))
+
+    @classmethod
+    def followers_page(cls, user_id, before=None, limit=FOLLOWS_PAGE_SIZE):
+        """A page of directory rows for the users following `user_id`, newest follow first."""
+
+        query = (cls.directory_query()
+                 .add_columns(Follows.created_at)
+                 .join(Follows, Follows.user_following_id == cls.id)
+                 .filter(Follows.user_being_followed_id == user_id))
+
+        return keyset_page(query, Follows.created_at, Follows.user_following_id,
+                           before, limit, row_key=lambda row: (row.created_at, row.id))
+
+    @classmethod
+    def search(cls, term, limit=SEARCH_RESULTS_LIMIT):
+        """Users whose username contains `term`, best matches first.
+
+        On PostgreSQL with pg_trgm, matches are read off the trigram GiST
+        index on username in order of trigram distance, so the LIMIT stops
+        the scan early. Elsewhere (SQLite test runs, or no pg_trgm) the
+        likeliest LIKE matches (exact, then prefix, then shortest) are
+        ranked in-process with the same trigram similarity.
+
+        Terms shorter than SEARCH_MIN_TRIGRAM_LENGTH only match the start
+        of usernames, read in order from the lower(username) index.
+        Returns directory_query() rows.
+        """
+
+        if len(term) < SEARCH_MIN_TRIGRAM_LENGTH:
+            return cls.prefix_search(term, limit)
+
+        matches = cls.directory_query().filter(cls.username.ilike(f"%{escape_like(term)}%", escape='\\'))
+
+        if has_trigram_search():
+            return (matches
+                    .order_by(cls.username.op('<->')(term), cls.username)
+                    .limit(limit)
+                    .all())
+
+        lowered, pattern = func.lower(cls.username), term.lower()
+        users = (matches
+                 .order_by((lowered == pattern).desc(),
+                           lowered.like(f"{escape_like(pattern)}%", escape='\\').desc(),
+                           func.length(cls.username),
+                           cls.username)
+                 .limit(SEARCH_FALLBACK_SCAN)
+                 .all())
+        users.sort(key=lambda user: (-trigram_similarity(user.username, term), user.username))
+
+        return users[:limit]
+
+    @classmethod
+    def prefix_search(cls, term, limit=SEARCH_RESULTS_LIMIT):
+        """Users whose username starts with `term` (any case), in username order."""
+
+        lowered = func.lower(cls.username)
+
+        if db.engine.dialect.name == 'postgresql':
+            # byte order, like ix_users_username_prefix, so the index can serve LIKE and ORDER BY
+            lowered = lowered.collate('C')
+
+        return (cls.directory_query()
+                .filter(lowered.like(f"{escape_like(term.lower())}%", escape='\\'))
+                .order_by(lowered)
+                .limit(limit)
+                .all())
 
     @classmethod
     def signup(cls, username, email, password, image_url):
@@ -143,13 +544,13 @@ class User(db.Model):
         Hashes password and adds user to system.
         """
 
-        hashed_pwd = bcrypt.generate_password_hash(password).decode('UTF-8')
+        hashed_pwd = hasher.hash(password)
 
         user = User(
             username=username,
             email=email,
             password=hashed_pwd,
-            image_url=image_url,
+            image_url=image_url or DEFAULT_IMAGE_URL,
         )
 
         db.session.add(user)
@@ -164,13 +565,18 @@ class User(db.Model):
         and, if it finds such a user, returns that user object.
 
         If can't find matching user (or if password is wrong), returns False.
+
+        A hash made with a different work factor than the configured one is
+        replaced while we have the plain password; the caller commits it.
         """
 
         user = cls.query.filter_by(username=username).first()
 
         if user:
-            is_auth = bcrypt.check_password_hash(user.password, password)
+            is_auth = hasher.check(user.password, password)
             if is_auth:
+                if hasher.needs_rehash(user.password):
+                    user.password = hasher.hash(password)
                 return user
 
         return False
@@ -180,12 +586,12 @@ class User(db.Model):
         """ Validates that the current password is correct, and updates password if correct.
         Confirms new password and confirm password match before updating the database. """
 
-        new_hashed_pwd = bcrypt.generate_password_hash(new_password).decode('UTF-8')
+        new_hashed_pwd = hasher.hash(new_password)
 
         return new_hashed_pwd
 
 
-class Message(db.Model):
+class Message(CounterMixin, db.Model):
     """An individual message ("warble")."""
 
     __tablename__ = 'messages'
@@ -203,7 +609,7 @@ class Message(db.Model):
     timestamp = db.Column(
         db.DateTime,
         nullable=False,
-        default=datetime.utcnow(),
+        default=datetime.utcnow,
     )
 
     user_id = db.Column(
@@ -212,8 +618,414 @@ class Message(db.Model):
         nullable=False,
     )
 
+    # denormalized count of likes (see CounterMixin), so showing it is free
+    likes_count = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0,
+        server_default='0',
+    )
+
     user = db.relationship('User')
 
+    # backs profile pages and the live home feed
+    __table_args__ = (
+        db.Index('ix_messages_user_id_timestamp', 'user_id', 'timestamp'),
+    )
+
+    @classmethod
+    def reconcile_counts(cls, criterion=None):
+        """Recompute likes_count from the likes table where it has drifted.
+
+        Optionally limited by `criterion`. Returns how many messages were fixed.
+        """
+
+        actual = (select([func.count()])
+                  .select_from(Likes.__table__)
+                  .where(Likes.message_id == cls.id)
+                  .as_scalar())
+
+        query = cls.query.filter(cls.likes_count != actual)
+
+        if criterion is not None:
+            query = query.filter(criterion)
+
+        return query.update({cls.likes_count: actual}, synchronize_session=False)
+
+    @classmethod
+    def home_feed(cls, user_id):
+        """Query for `user_id`'s own messages plus those of everyone they follow.
+
+        The follow list stays in the database as a semi-join against
+        follows, so this is one statement however many users are followed.
+        It's the source of truth that materialized timelines are built from.
+        """
+
+        followed_ids = (db.session
+                        .query(Follows.user_being_followed_id)
+                        .filter(Follows.user_following_id == user_id))
+
+        return cls.query.filter(or_(cls.user_id == user_id, cls.user_id.in_(followed_ids)))
+
+    @classmethod
+    def home_feed_page(cls, user_id, before=None, limit=FEED_PAGE_SIZE):
+        """A page of home_feed(), newest first, read live instead of from timeline_entries."""
+
+        query = cls.home_feed(user_id).options(joinedload(cls.user))
+
+        return keyset_page(query, cls.timestamp, cls.id, before, limit)
+
+    @classmethod
+    def timeline_page(cls, user_id, before=None, limit=FEED_PAGE_SIZE):
+        """A page of `user_id`'s home timeline, newest first."""
+
+        query = (cls.query
+                 .join(TimelineEntry, TimelineEntry.message_id == cls.id)
+                 .filter(TimelineEntry.user_id == user_id)
+                 .options(joinedload(cls.user)))
+
+        return keyset_page(query, TimelineEntry.timestamp, TimelineEntry.message_id, before, limit)
+
+    @classmethod
+    def posted_page(cls, user_id, before=None, limit=FEED_PAGE_SIZE):
+        """A page of the messages `user_id` has posted, newest first."""
+
+        query = cls.query.filter(cls.user_id == user_id).options(joinedload(cls.user))
+
+        return keyset_page(query, cls.timestamp, cls.id, before, limit)
+
+    @classmethod
+    def liked_page(cls, user_id, before=None, limit=FEED_PAGE_SIZE):
+        """A page of the messages `user_id` has liked, newest like first.
+
+        Ordered by when they were liked, so the page is read straight off
+        the (user_id, created_at) likes index.
+        """
+
+        query = (db.session.query(cls, Likes.created_at)
+                 .join(Likes, Likes.message_id == cls.id)
+                 .filter(Likes.user_id == user_id)
+                 .options(joinedload(cls.user)))
+
+        rows, next_cursor = keyset_page(query, Likes.created_at, Likes.message_id, before, limit,
+                                        row_key=lambda row: (row.created_at, row.Message.id))
+
+        return [row.Message for row in rows], next_cursor
+
+    @classmethod
+    def latest_posted(cls, user_id):
+        """(timestamp, id) of `user_id`'s newest message, or None.
+
+        Together with the user's messages_count this changes whenever their
+        posted feed does, since new messages always sort first.
+        """
+
+        return (db.session.query(cls.timestamp, cls.id)
+                .filter(cls.user_id == user_id)
+                .order_by(cls.timestamp.desc(), cls.id.desc())
+                .first())
+
+
+class TimelineEntry(db.Model):
+    """A message materialized into one user's home timeline.
+
+    Rows are written when a message is posted (fan-out-on-write) so the
+    homepage is a single indexed range read instead of a query over every
+    followed user's messages.
+    """
+
+    __tablename__ = 'timeline_entries'
+
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey('users.id', ondelete='cascade'),
+        primary_key=True,
+    )
+
+    message_id = db.Column(
+        db.Integer,
+        db.ForeignKey('messages.id', ondelete='cascade'),
+        primary_key=True,
+    )
+
+    author_id = db.Column(
+        db.Integer,
+        db.ForeignKey('users.id', ondelete='cascade'),
+        nullable=False,
+    )
+
+    timestamp = db.Column(
+        db.DateTime,
+        nullable=False,
+    )
+
+    __table_args__ = (
+        db.Index('ix_timeline_entries_user_id_timestamp',
+                 'user_id', 'timestamp', 'message_id'),
+    )
+
+    @classmethod
+    def fan_out(cls, message):
+        """Add a new (flushed) message to its author's and followers' timelines."""
+
+        followers = select([
+            Follows.user_following_id,
+            literal(message.id),
+            literal(message.user_id),
+            literal(message.timestamp),
+        ]).where(and_(
+            Follows.user_being_followed_id == message.user_id,
+            # a user who follows themself already gets the author's entry
+            Follows.user_following_id != message.user_id))
+
+        db.session.add(cls(user_id=message.user_id,
+                           message_id=message.id,
+                           author_id=message.user_id,
+                           timestamp=message.timestamp))
+        db.session.execute(cls.__table__.insert().from_select(
+            ['user_id', 'message_id', 'author_id', 'timestamp'], followers))
+
+    @classmethod
+    def add_author(cls, user_id, author_id):
+        """Copy all of `author_id`'s messages into `user_id`'s timeline."""
+
+        if user_id == author_id:
+            # own messages are always there
+            return
+
+        messages = select([
+            literal(user_id),
+            Message.id,
+            Message.user_id,
+            Message.timestamp,
+        ]).where(Message.user_id == author_id)
+
+        db.session.execute(cls.__table__.insert().from_select(
+            ['user_id', 'message_id', 'author_id', 'timestamp'], messages))
+
+    @classmethod
+    def remove_author(cls, user_id, author_id):
+        """Drop all of `author_id`'s messages from `user_id`'s timeline."""
+
+        if user_id == author_id:
+            # own messages stay
+            return
+
+        (cls.query
+            .filter(cls.user_id == user_id, cls.author_id == author_id)
+            .delete(synchronize_session=False))
+
+    @classmethod
+    def page_key(cls, user_id, before=None, limit=FEED_PAGE_SIZE):
+        """What a page of `user_id`'s timeline would show, without loading it.
+
+        Returns (message_id, author's profile_version, likes_count) for each
+        entry on the page, read from the timeline index and the messages' and
+        authors' rows only.
+        """
+
+        query = (db.session.query(cls.timestamp, cls.message_id, User.profile_version,
+                                  Message.likes_count)
+                 .join(User, User.id == cls.author_id)
+                 .join(Message, Message.id == cls.message_id)
+                 .filter(cls.user_id == user_id))
+
+        rows, _ = keyset_page(query, cls.timestamp, cls.message_id, before, limit,
+                              row_key=lambda row: (row.timestamp, row.message_id))
+
+        return [(row.message_id, row.profile_version, row.likes_count) for row in rows]
+
+    @classmethod
+    def remove_message(cls, message_id):
+        """Drop a message from every timeline it was fanned out to."""
+
+        cls.query.filter(cls.message_id == message_id).delete(synchronize_session=False)
+
+    @classmethod
+    def rebuild(cls, user_id):
+        """Rebuild one user's timeline from Message.home_feed().
+
+        Returns the number of timeline entries written.
+        """
+
+        messages = Message.home_feed(user_id).with_entities(
+            literal(user_id),
+            Message.id,
+            Message.user_id,
+            Message.timestamp,
+        )
+
+        cls.query.filter(cls.user_id == user_id).delete(synchronize_session=False)
+        db.session.execute(cls.__table__.insert().from_select(
+            ['user_id', 'message_id', 'author_id', 'timestamp'], messages.statement))
+
+        return cls.query.filter(cls.user_id == user_id).count()
+
+    @classmethod
+    def backfill(cls):
+        """Rebuild every timeline from the messages and follows tables.
+
+        Returns the number of timeline entries written.
+        """
+
+        own = select([
+            Message.user_id.label('user_id'),
+            Message.id,
+            Message.user_id.label('author_id'),
+            Message.timestamp,
+        ])
+
+        followed = select([
+            Follows.user_following_id,
+            Message.id,
+            Message.user_id,
+            Message.timestamp,
+        ]).select_from(
+            Follows.__table__.join(
+                Message.__table__,
+                Message.user_id == Follows.user_being_followed_id)
+        ).where(Follows.user_following_id != Follows.user_being_followed_id)
+
+        cls.query.delete(synchronize_session=False)
+        db.session.execute(cls.__table__.insert().from_select(
+            ['user_id', 'message_id', 'author_id', 'timestamp'],
+            own.union_all(followed)))
+
+        return cls.query.count()
+
+
+def insert_or_ignore(table, **values):
+    """An INSERT of one row into `table` that does nothing if the row exists.
+
+    ON CONFLICT DO NOTHING on PostgreSQL, INSERT OR IGNORE elsewhere (SQLite).
+    """
+
+    if db.engine.dialect.name == 'postgresql':
+        return postgresql.insert(table).values(**values).on_conflict_do_nothing()
+
+    return table.insert().values(**values).prefix_with('OR IGNORE')
+
+
+def escape_like(term):
+    """Escape LIKE wildcards in user input (with backslash as the escape)."""
+
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def trigrams(text):
+    """The set of trigrams pg_trgm would extract from `text`."""
+
+    result = set()
+
+    # like pg_trgm, anything that isn't a letter or digit separates words
+    for word in re.findall(r'[^\W_]+', text.lower()):
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+
+    return result
+
+
+def trigram_similarity(a, b):
+    """pg_trgm's similarity(): shared trigrams over all trigrams, 0 to 1."""
+
+    a, b = trigrams(a), trigrams(b)
+
+    if not a or not b:
+        return 0.0
+
+    return len(a & b) / len(a | b)
+
+
+# engine url -> whether pg_trgm is installed there
+_trigram_support = {}
+
+
+def create_search_indexes():
+    """Create pg_trgm (where available) and the SEARCH_INDEXES on PostgreSQL.
+
+    For databases built with db.create_all() rather than the migrations.
+    """
+
+    engine = db.engine
+
+    if engine.dialect.name != 'postgresql':
+        return
+
+    if engine.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'").scalar():
+        engine.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    _trigram_support.pop(str(engine.url), None)
+
+    for name, ddl in SEARCH_INDEXES.items():
+        if name != 'ix_users_username_trgm' or has_trigram_search():
+            engine.execute(ddl)
+
+
+def has_trigram_search():
+    """Is the pg_trgm extension installed in the app's database?"""
+
+    engine = db.engine
+    key = str(engine.url)
+
+    if key not in _trigram_support:
+        _trigram_support[key] = (
+            engine.dialect.name == 'postgresql' and
+            engine.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'").scalar() is not None)
+
+    return _trigram_support[key]
+
+
+def encode_cursor(timestamp, id):
+    """Build the opaque "continue after this row" cursor for a (timestamp, id) key."""
+
+    return f"{timestamp.isoformat()}_{id}"
+
+
+def decode_cursor(cursor):
+    """Turn a cursor back into its (timestamp, id) key.
+
+    Raises ValueError if the cursor is malformed, including ids outside
+    the database's 64-bit range and timestamps with a UTC offset (cursors
+    are made from naive UTC timestamps).
+    """
+
+    timestamp, _, id = cursor.rpartition('_')
+    timestamp, id = datetime.fromisoformat(timestamp), int(id)
+
+    if not 0 <= id < 2 ** 63:
+        raise ValueError(f"cursor id out of range: {id}")
+
+    if timestamp.tzinfo is not None:
+        raise ValueError(f"cursor timestamp has a UTC offset: {timestamp}")
+
+    return timestamp, id
+
+
+def keyset_page(query, timestamp_col, id_col, before=None, limit=FEED_PAGE_SIZE,
+                row_key=lambda row: (row.timestamp, row.id)):
+    """Return one page of `query` ordered by (timestamp, id) descending.
+
+    `before` is a decoded cursor; only rows strictly older than it are
+    returned, so every page is an index range scan no matter how deep the
+    reader has scrolled (no OFFSET). `row_key` gives a result row's
+    (timestamp, id). Returns (rows, next_cursor), where next_cursor is None
+    on the last page.
+    """
+
+    if before:
+        query = query.filter(tuple_(timestamp_col, id_col) < tuple_(*before))
+
+    rows = (query
+            .order_by(timestamp_col.desc(), id_col.desc())
+            .limit(limit + 1)
+            .all())
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(*row_key(rows[-1]))
+
+    return rows, None
+
 
 def connect_db(app):
     """Connect this database to provided Flask app.
@@ -221,5 +1033,9 @@ def connect_db(app):
     You should call this in your Flask app.
     """
 
-    db.app = app
+    if db.app is None:
+        # the app models use outside an app context; the first one wins so
+        # building another app doesn't repoint this one
+        db.app = app
+
     db.init_app(app)
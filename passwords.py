@@ -0,0 +1,192 @@
+"""Password hashing off the request thread.
+
+bcrypt is deliberately slow, so hashing or checking a password inside the
+request worker holds that worker (and its CPU) for the whole computation.
+PasswordHasher runs bcrypt in a small process pool instead, so a burst of
+logins queues up behind BCRYPT_POOL_SIZE processes rather than stalling
+feed traffic. At most BCRYPT_MAX_PENDING jobs may be queued or running;
+past that, hashing raises HasherBusy and the app answers 503. The calling
+thread still waits for its result, so the other requests only keep moving
+if the server has other threads to run them (see gunicorn.conf.py).
+
+BCRYPT_LOG_ROUNDS sets the work factor for new hashes. Stored hashes with a
+different cost are upgraded the next time their owner logs in (see
+needs_rehash()). BCRYPT_POOL_SIZE = 0 runs bcrypt inline, which the tests use.
+
+AppHasher gives each app its own PasswordHasher built from those settings,
+so code like the models can hash with whichever app is current.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from threading import BoundedSemaphore, Lock
+from time import perf_counter
+
+import bcrypt
+from flask import current_app, has_app_context
+
+# pool processes start from a clean single-threaded server process rather
+# than a fork of the (threaded) worker; see gunicorn.conf.py
+POOL_CONTEXT = multiprocessing.get_context('forkserver')
+
+
+class HasherBusy(Exception):
+    """Too many password hashes are already queued."""
+
+
+def _hash(password, log_rounds):
+    """Hash `password` with a new salt. Runs in a pool process."""
+
+    return bcrypt.hashpw(password.encode('UTF-8'),
+                         bcrypt.gensalt(log_rounds)).decode('UTF-8')
+
+
+def _check(hashed, password):
+    """Does `password` match `hashed`? Runs in a pool process."""
+
+    return bcrypt.checkpw(password.encode('UTF-8'), hashed.encode('UTF-8'))
+
+
+class PasswordHasher:
+    """Hashes and checks passwords in a bounded process pool."""
+
+    def __init__(self, log_rounds=12, pool_size=0, max_pending=None):
+        self.configure(log_rounds, pool_size, max_pending)
+
+        self.completed = 0
+        self.rejected = 0
+        self.peak_pending = 0
+        self.total_wait = 0.0
+        self._pending = 0
+        self._lock = Lock()
+        self._pool = None
+        self._pool_pid = None
+
+    def configure(self, log_rounds, pool_size, max_pending=None):
+        """Set the work factor and pool bounds (drops any running pool)."""
+
+        self.log_rounds = log_rounds
+        self.pool_size = pool_size
+        self.max_pending = max_pending or max(pool_size, 1) * 4
+        self._slots = BoundedSemaphore(self.max_pending)
+        self.shutdown()
+
+    def hash(self, password):
+        """A new bcrypt hash of `password` at the configured cost."""
+
+        if not password:
+            raise ValueError('Password must be non-empty.')
+
+        return self._run(_hash, password, self.log_rounds)
+
+    def check(self, hashed, password):
+        """Does `password` match the stored `hashed`?"""
+
+        return self._run(_check, hashed, password)
+
+    def needs_rehash(self, hashed):
+        """Was `hashed` made with a different cost than the configured one?"""
+
+        # bcrypt hashes look like $2b$12$<salt+hash>
+        return int(hashed.split('$')[2]) != self.log_rounds
+
+    def stats(self):
+        """Queue depth and throughput counters for this process."""
+
+        with self._lock:
+            return {
+                'pool_size': self.pool_size,
+                'max_pending': self.max_pending,
+                'pending': self._pending,
+                'peak_pending': self.peak_pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'avg_wait_ms': (1000 * self.total_wait / self.completed
+                                if self.completed else 0.0),
+            }
+
+    def shutdown(self):
+        """Stop the pool; a new one starts on the next hash."""
+
+        pool = getattr(self, '_pool', None)
+        self._pool = None
+
+        if pool is not None and self._pool_pid == os.getpid():
+            pool.shutdown(wait=False)
+
+    def _run(self, fn, *args):
+        """Run `fn(*args)` in the pool (or inline), counting it against the queue."""
+
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HasherBusy()
+
+        with self._lock:
+            self._pending += 1
+            self.peak_pending = max(self.peak_pending, self._pending)
+
+        start = perf_counter()
+
+        try:
+            if self.pool_size:
+                return self._get_pool().submit(fn, *args).result()
+
+            return fn(*args)
+
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self.completed += 1
+                self.total_wait += perf_counter() - start
+
+            self._slots.release()
+
+    def _get_pool(self):
+        """This process's pool, started on first use (and again after a fork)."""
+
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.pool_size,
+                                                 mp_context=POOL_CONTEXT)
+                self._pool_pid = os.getpid()
+
+            return self._pool
+
+
+class AppHasher:
+    """The current app's PasswordHasher, for code that isn't handed one.
+
+    Attribute access is passed through to the hasher in
+    app.extensions['password_hasher']. Outside an app context the first
+    app set up is used, as db falls back to db.app.
+    """
+
+    def __init__(self):
+        self._default = None
+
+    def init_app(self, app):
+        """Give `app` a hasher configured from BCRYPT_LOG_ROUNDS, BCRYPT_POOL_SIZE and BCRYPT_MAX_PENDING."""
+
+        hasher = PasswordHasher(app.config.get('BCRYPT_LOG_ROUNDS', 12),
+                                app.config.get('BCRYPT_POOL_SIZE', 0),
+                                app.config.get('BCRYPT_MAX_PENDING'))
+        app.extensions['password_hasher'] = hasher
+
+        if self._default is None:
+            self._default = hasher
+
+    def get(self):
+        """The current app's hasher (or the first app's, outside an app context)."""
+
+        if has_app_context() and 'password_hasher' in current_app.extensions:
+            return current_app.extensions['password_hasher']
+
+        if self._default is None:
+            raise RuntimeError("No app has been set up with AppHasher.init_app()")
+
+        return self._default
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
@@ -0,0 +1,70 @@
+"""Per-request SQL statement counting with an optional query budget.
+
+Every statement run on any engine during a request is counted (hooked into
+SQLAlchemy's engine events). If SQL_QUERY_BUDGET is set, each response gets
+an X-Query-Count header and requests that run more statements than the
+budget are logged, or fail outright when SQL_QUERY_BUDGET_STRICT is on.
+That makes N+1 query regressions show up in the view tests.
+"""
+
+import logging
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    """A request ran more SQL statements than its budget allows."""
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    """Count a statement against the current request."""
+
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+
+def reset_query_count():
+    """Start counting from zero for this request."""
+
+    g.query_count = 0
+
+
+def check_query_budget(response):
+    """Report the request's statement count and enforce SQL_QUERY_BUDGET."""
+
+    budget = current_app.config.get('SQL_QUERY_BUDGET')
+
+    if budget is None:
+        return response
+
+    count = g.get('query_count', 0)
+    response.headers['X-Query-Count'] = str(count)
+
+    if count > budget:
+        msg = f"{request.endpoint} ran {count} SQL queries (budget is {budget})"
+
+        if current_app.config.get('SQL_QUERY_BUDGET_STRICT'):
+            raise QueryBudgetExceeded(msg)
+
+        logger.warning(msg)
+
+    return response
+
+
+def init_query_budget(app):
+    """Install the query counter on `app`.
+
+    Call this before registering other before_request handlers so their
+    queries are counted too.
+    """
+
+    app.config.setdefault('SQL_QUERY_BUDGET', None)
+    app.config.setdefault('SQL_QUERY_BUDGET_STRICT', False)
+
+    app.before_request(reset_query_count)
+    app.after_request(check_query_budget)
@@ -0,0 +1,88 @@
+"""Routing reads to read replicas.
+
+Replicas are extra SQLALCHEMY_BINDS named replica_0, replica_1, ... (see
+DATABASE_REPLICA_URLS in config.py). A GET or HEAD request picks one of them
+and the session sends that request's SELECTs there; everything else
+(flushes, bulk UPDATE/DELETE, raw SQL, SELECT ... FOR UPDATE, and any
+request that isn't a GET) goes to the primary.
+
+Replicas lag the primary, so a client that has just written is pinned to
+the primary for REPLICA_PIN_SECONDS: a request that writes stamps the
+client's session, and reads inside that window skip the replicas. That
+way people see their own follows, likes and posts straight away.
+"""
+
+import random
+from time import time
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import orm
+from sqlalchemy.sql import Select, CompoundSelect
+
+PIN_KEY = '_primary_until'
+
+
+class RoutingSession(SignallingSession):
+    """A session that runs a read-only request's SELECTs on its replica."""
+
+    def get_bind(self, mapper=None, clause=None):
+        if has_request_context():
+            if self._flushing or not is_read(clause):
+                g.wrote_primary = True
+
+            elif g.get('read_replica') is not None:
+                return get_state(self.app).db.get_engine(self.app, bind=g.read_replica)
+
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy, with sessions that can read from replicas."""
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def is_read(clause):
+    """Is `clause` a plain SELECT (safe to run on a replica)?"""
+
+    if isinstance(clause, CompoundSelect):
+        return True
+
+    return isinstance(clause, Select) and clause._for_update_arg is None
+
+
+def replica_binds(app):
+    """The names of `app`'s replica binds."""
+
+    return sorted(key for key in app.config.get('SQLALCHEMY_BINDS') or ()
+                  if key.startswith('replica_'))
+
+
+def choose_replica():
+    """before_request: pick a replica for this request, if it may use one."""
+
+    replicas = replica_binds(current_app)
+
+    if (replicas
+            and request.method in ('GET', 'HEAD')
+            and session.get(PIN_KEY, 0) <= time()):
+        g.read_replica = random.choice(replicas)
+
+
+def pin_after_write(response):
+    """after_request: keep a client that just wrote on the primary for a while."""
+
+    if g.get('wrote_primary') and replica_binds(current_app):
+        session[PIN_KEY] = time() + current_app.config['REPLICA_PIN_SECONDS']
+
+    return response
+
+
+def init_replicas(app):
+    """Route reads to replicas for `app`."""
+
+    app.config.setdefault('REPLICA_PIN_SECONDS', 5)
+    app.before_request(choose_replica)
+    app.after_request(pin_after_write)
@@ -0,0 +1,62 @@
+// "Load more" on feeds: fetch just the next page of rows and swap them in
+// for the button, instead of following the link to a full page reload.
+$(document).on('click', '.load-more a[data-more-url]', function (evt) {
+  evt.preventDefault();
+
+  const $item = $(this).closest('li');
+
+  $.get($(this).data('more-url'), function (rows) {
+    $item.replaceWith(rows);
+  });
+});
+
+// Like and follow buttons: toggle through the JSON API (POST to add,
+// DELETE to remove) and update the button and any counts shown, instead
+// of submitting the form and re-rendering the page. Without JS, or if the
+// request fails, the form still works the old way.
+const TOGGLE_STYLES = {
+  liked: {on: 'btn-primary', off: 'btn-secondary'},
+  following: {on: 'btn-primary', off: 'btn-outline-primary', labels: ['Unfollow', 'Follow']},
+};
+
+$(document).on('submit', 'form[data-api-url]', function (evt) {
+  evt.preventDefault();
+
+  const form = this;
+  const $form = $(form);
+  const $button = $form.find('button').prop('disabled', true);
+
+  $.ajax({
+    url: $form.data('api-url'),
+    method: $form.attr('data-active') === 'true' ? 'DELETE' : 'POST',
+    dataType: 'json',
+  }).done(function (state) {
+    const key = 'liked' in state ? 'liked' : 'following';
+    const style = TOGGLE_STYLES[key];
+    const active = state[key];
+
+    $form.attr('data-active', String(active)).attr('data-toggled', 'true');
+    $button.toggleClass(style.on, active).toggleClass(style.off, !active);
+    if (style.labels) {
+      $button.text(style.labels[active ? 0 : 1]);
+    }
+
+    if ('likes_count' in state) {
+      $(`[data-message-id="${state.message_id}"][data-count="likes_count"]`).text(state.likes_count);
+    }
+    $.each(state.counts, function (userId, counts) {
+      $.each(counts, function (name, value) {
+        $(`[data-user-id="${userId}"][data-count="${name}"]`).text(value);
+      });
+    });
+  }).fail(function () {
+    // the form's action is stale once we've toggled it, so just reload
+    if ($form.attr('data-toggled')) {
+      window.location.reload();
+    } else {
+      form.submit();
+    }
+  }).always(function () {
+    $button.prop('disabled', false);
+  });
+});
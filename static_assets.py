@@ -0,0 +1,148 @@
+"""Content-hashed static files.
+
+At startup every file under static/ is hashed and url_for('static', ...)
+is pointed at a fingerprinted name (images/warbler-logo.png becomes
+images/warbler-logo.3f2a9c1d04be.png). A fingerprinted URL never changes
+content, so it's served with a year-long, immutable Cache-Control and
+browsers stop asking for it on repeat visits. /static/ URLs inside CSS
+files are rewritten to their fingerprinted names too.
+
+Unhashed names still work (with the app's normal caching), and in debug
+mode nothing is fingerprinted so edits show up without a restart.
+"""
+
+import hashlib
+import os
+import re
+
+from flask import current_app, url_for, send_from_directory
+
+ONE_YEAR = 365 * 24 * 60 * 60
+
+CSS_URL = re.compile(r'''url\(\s*(['"]?)/static/([^'")]+)\1\s*\)''')
+
+
+class AssetManifest:
+    """One app's static folder and the fingerprinted names of its files."""
+
+    def __init__(self, static_folder, static_url_path):
+        self.static_folder = static_folder
+        self.static_url_path = static_url_path
+        self.manifest = {}
+        self.files = {}
+
+    def build(self):
+        """Hash every file under the static folder (CSS last, after rewriting)."""
+
+        self.manifest = {}
+        self.files = {}
+        stylesheets = []
+
+        for root, _, filenames in os.walk(self.static_folder):
+            for name in sorted(filenames):
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, self.static_folder).replace(os.sep, '/')
+
+                if filename.endswith('.css'):
+                    stylesheets.append((filename, path))
+                    continue
+
+                with open(path, 'rb') as f:
+                    self._add(filename, f.read())
+
+        for filename, path in stylesheets:
+            with open(path, encoding='UTF-8') as f:
+                css = CSS_URL.sub(self._rewrite_css_url, f.read())
+
+            self._add(filename, css.encode('UTF-8'), body=css)
+
+    def _add(self, filename, content, body=None):
+        """Record `filename`'s fingerprinted name (and rewritten body, if any)."""
+
+        digest = hashlib.sha256(content).hexdigest()[:12]
+        stem, ext = os.path.splitext(filename)
+        hashed = f"{stem}.{digest}{ext}"
+
+        self.manifest[filename] = hashed
+        self.files[hashed] = (filename, body)
+
+    def _rewrite_css_url(self, match):
+        filename = match.group(2)
+        return f'url("{self.static_url_path}/{self.manifest.get(filename, filename)}")'
+
+
+class StaticAssets:
+    """Serves and links fingerprinted static files for each app it's set up on.
+
+    Each app's AssetManifest lives in app.extensions['static_assets'], and
+    the hooks below act on the current app's.
+    """
+
+    def init_app(self, app):
+        """Fingerprint app.static_folder and take over the 'static' endpoint."""
+
+        assets = AssetManifest(app.static_folder, app.static_url_path)
+
+        if not app.debug:
+            assets.build()
+
+        app.extensions['static_assets'] = assets
+        app.url_defaults(self.hashed_filename)
+        app.view_functions['static'] = self.send_static
+        app.add_template_filter(self.static_url)
+
+    @property
+    def assets(self):
+        """The current app's AssetManifest."""
+
+        return current_app.extensions['static_assets']
+
+    @property
+    def manifest(self):
+        """The current app's original name -> fingerprinted name map."""
+
+        return self.assets.manifest
+
+    def hashed_filename(self, endpoint, values):
+        """url_for() hook: swap a static filename for its fingerprinted name."""
+
+        manifest = self.manifest
+
+        if endpoint == 'static' and values.get('filename') in manifest:
+            values['filename'] = manifest[values['filename']]
+
+    def send_static(self, filename):
+        """Serve a static file; fingerprinted names are cached for a year."""
+
+        assets = self.assets
+        entry = assets.files.get(filename)
+
+        if entry is None:
+            return send_from_directory(assets.static_folder, filename)
+
+        original, body = entry
+
+        if body is not None:
+            response = current_app.response_class(body, mimetype='text/css')
+        else:
+            response = send_from_directory(assets.static_folder, original)
+
+        response.cache_control.public = True
+        response.cache_control.max_age = ONE_YEAR
+        response.cache_control.immutable = True
+
+        return response
+
+    def static_url(self, url):
+        """Template filter: the fingerprinted URL for a '/static/...' path.
+
+        For image URLs stored in the database, which may point at a static
+        default or somewhere else entirely.
+        """
+
+        prefix = self.assets.static_url_path + '/'
+
+        if url and url.startswith(prefix):
+            return url_for('static', filename=url[len(prefix):])
+
+        return url
@@ -0,0 +1,79 @@
+"""App factory tests."""
+# FLASK_ENV=production python3 -m unittest test_app_factory.py
+
+import os
+import subprocess
+import sys
+from unittest import TestCase
+
+from flask import url_for
+
+#set environment to test database
+os.environ['DATABASE_URL'] = "postgresql:///warbler-test"
+
+from app import create_app
+from models import hasher
+
+
+def has_toolbar(app):
+    return any(type(getattr(hook, '__self__', None)).__name__ == 'DebugToolbarExtension'
+               for hook in app.after_request_funcs.get(None, []))
+
+
+class AppFactoryTestCase(TestCase):
+    """Test the configuration profiles."""
+
+    def test_production_profile(self):
+        """ Does production leave out the toolbar and configure the connection pool? """
+
+        app = create_app('production')
+
+        self.assertFalse(app.debug)
+        self.assertFalse(has_toolbar(app))
+        self.assertFalse(app.config['SQLALCHEMY_ECHO'])
+        self.assertTrue(app.config['SQLALCHEMY_ENGINE_OPTIONS']['pool_pre_ping'])
+        self.assertIn('pool_size', app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+        self.assertIn('homepage', [rule.endpoint for rule in app.url_map.iter_rules()])
+        self.assertIn('backfill-timelines', app.cli.commands)
+
+    def test_production_skips_toolbar_import(self):
+        """ Does production avoid importing flask_debugtoolbar at all? """
+
+        # imports are per process, so this one needs a fresh interpreter
+        out = subprocess.run(
+            [sys.executable, '-c', "import sys; from app import create_app; create_app('production'); "
+                                   "print('flask_debugtoolbar' in sys.modules)"],
+            check=True, stdout=subprocess.PIPE, cwd=os.path.dirname(os.path.abspath(__file__)))
+
+        self.assertEqual(out.stdout.split()[-1], b'False')
+
+    def test_development_profile(self):
+        """ Does development run in debug mode with the toolbar? """
+
+        app = create_app('development')
+
+        self.assertTrue(app.debug)
+        self.assertTrue(has_toolbar(app))
+
+    def test_apps_keep_their_own_settings(self):
+        """ Does building a second app leave the first one's settings alone? """
+
+        first = create_app('testing')
+        first.config['COMPRESS_MIN_SIZE'] = 10 ** 9
+        second = create_app('development')
+
+        with first.test_request_context():
+            self.assertEqual(hasher.log_rounds, 4)
+            self.assertRegex(url_for('static', filename='stylesheets/style.css'),
+                             r'style\.[0-9a-f]{12}\.css$')
+
+        with second.test_request_context():
+            self.assertEqual(hasher.log_rounds, second.config['BCRYPT_LOG_ROUNDS'])
+            self.assertEqual(url_for('static', filename='stylesheets/style.css'),
+                             '/static/stylesheets/style.css')
+
+        res = first.test_client().get("/signup", headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', res.headers)
+
+        res = second.test_client().get("/signup", headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
@@ -2,14 +2,17 @@
 # FLASK_ENV=production python3 -m unittest test_message_model.py
 
 import os
+from datetime import datetime
 from unittest import TestCase
 from sqlalchemy import exc
-from models import db, User, Message, Likes
+from models import db, User, Message, Likes, encode_cursor, decode_cursor
 
 #set environment to test database
 os.environ['DATABASE_URL'] = "postgresql:///warbler-test"
+#use the testing config profile (see config.py)
+os.environ['FLASK_CONFIG'] = "testing"
 # import app after setting DB
-from app import app
+from wsgi import app
 
 #create initial tables
 db.create_all()
@@ -156,3 +159,69 @@ class MessageModelTestCase(TestCase):
         self.assertEqual(likes[0].message_id, self.message2.id)
         self.assertEqual(likes[1].message_id, self.message1.id)
 
+    def test_posted_page_cursor(self):
+        """ Does posted_page walk a user's messages newest first, one page at a time? """
+
+        for day in range(1, 6):
+            self.user1.messages.append(Message(text=f"Day {day}", timestamp=datetime(2020, 1, day)))
+        db.session.commit()
+
+        page1, cursor = Message.posted_page(self.user1.id, limit=3)
+        page2, last_cursor = Message.posted_page(self.user1.id, before=decode_cursor(cursor), limit=3)
+
+        self.assertEqual([msg.text for msg in page1], ["User1 post a message!", "Day 5", "Day 4"])
+        self.assertEqual(len(page1) + len(page2), 6)
+        self.assertIsNone(last_cursor)
+        self.assertFalse(set(page1) & set(page2))
+
+    def test_cursor_round_trip(self):
+        """ Does decode_cursor undo encode_cursor, and reject garbage? """
+
+        self.message1.timestamp = datetime(2020, 5, 17, 12, 30, 1, 42)
+
+        self.assertEqual(decode_cursor(encode_cursor(self.message1.timestamp, self.message1.id)), (self.message1.timestamp, self.message1.id))
+        with self.assertRaises(ValueError):
+            decode_cursor("not-a-cursor")
+        with self.assertRaises(ValueError):
+            decode_cursor("2020-01-01T00:00:00_99999999999999999999")
+        with self.assertRaises(ValueError):
+            decode_cursor("2020-01-01T00:00:00_-1")
+        with self.assertRaises(ValueError):
+            decode_cursor("2020-01-01T00:00:00+05:00_1")
+
+    def test_likes_by_many_users(self):
+        """ Can several users like one message, once each, with likes_count kept in step? """
+
+        self.assertTrue(Likes.add(self.user1.id, self.message2.id))
+        self.assertTrue(Likes.add(self.user2.id, self.message2.id))
+        self.assertFalse(Likes.add(self.user2.id, self.message2.id))
+        Message.adjust_counts(self.message2.id, likes_count=2)
+        db.session.commit()
+
+        self.assertEqual(Likes.query.filter_by(message_id=self.message2.id).count(), 2)
+        self.assertEqual(Message.query.get(2).likes_count, 2)
+        self.assertEqual(Message.reconcile_counts(), 0)
+
+        self.assertTrue(Likes.remove(self.user1.id, self.message2.id))
+        db.session.commit()
+
+        self.assertEqual(Message.reconcile_counts(), 1)
+        self.assertEqual(Message.query.get(2).likes_count, 1)
+
+    def test_liked_page_newest_like_first(self):
+        """ Does liked_page list messages by when they were liked, a page at a time? """
+
+        message3 = Message(text="Another one", user_id=self.user2.id)
+        db.session.add(message3)
+        db.session.commit()
+
+        for day, msg in enumerate([message3, self.message1, self.message2], start=1):
+            db.session.add(Likes(user_id=self.user2.id, message_id=msg.id, created_at=datetime(2020, 1, day)))
+        db.session.commit()
+
+        page1, cursor = Message.liked_page(self.user2.id, limit=2)
+        page2, last_cursor = Message.liked_page(self.user2.id, before=decode_cursor(cursor), limit=2)
+
+        self.assertEqual([msg.id for msg in page1], [self.message2.id, self.message1.id])
+        self.assertEqual([msg.id for msg in page2], [message3.id])
+        self.assertIsNone(last_cursor)
@@ -8,7 +8,7 @@
 import os
 from unittest import TestCase
 
-from models import db, connect_db, Message, User
+from models import db, connect_db, Message, User, Follows, TimelineEntry
 
 # BEFORE we import our app, let's set an environmental variable
 # to use a different database for tests (we need to do this
@@ -16,11 +16,14 @@ from models import db, connect_db, Message, User
 # connected to the database
 
 os.environ['DATABASE_URL'] = "postgresql:///warbler-test"
+#use the testing config profile (see config.py)
+os.environ['FLASK_CONFIG'] = "testing"
 
 
 # Now we can import app
 
-from app import app, CURR_USER_KEY
+from wsgi import app
+from app import CURR_USER_KEY, fragment_cache
 
 # Create our tables (we do this here, so we only create the tables
 # once for all tests --- in each test, we'll delete the data
@@ -76,7 +79,55 @@ class MessageViewTestCase(TestCase):
 
             msg = Message.query.one()
             self.assertEqual(msg.text, "Hello")
+            self.assertEqual(User.query.get(self.testuser.id).messages_count, 1)
     
+    def test_add_message_query_count(self):
+        """ Does posting cost the same number of queries however many messages the author has? """
+
+        user_id = self.testuser.id
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = user_id
+
+            db.session.expunge_all()
+            first = c.post("/messages/new", data={"text": "First"}).headers['X-Query-Count']
+
+            db.session.add_all([Message(text=f"Old {i}", user_id=user_id) for i in range(50)])
+            db.session.commit()
+            db.session.expunge_all()
+            res = c.post("/messages/new", data={"text": "Latest"})
+
+            self.assertEqual(res.status_code, 302)
+            self.assertEqual(res.headers['X-Query-Count'], first)
+            self.assertEqual(first, '5')
+
+    def test_add_message_fans_out(self):
+        """ Does messages_add() add the new message to the author's and followers' timelines? """
+
+        follower = User.signup(username="follower", email="follower@test.com", password="follower", image_url=None)
+        follower.id = 20
+        db.session.commit()
+        db.session.add(Follows(user_being_followed_id=self.testuser.id, user_following_id=20))
+        db.session.commit()
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testuser.id
+
+            c.post("/messages/new", data={"text": "Hello followers"})
+
+            msg = Message.query.one()
+            owners = sorted(entry.user_id for entry in TimelineEntry.query.filter_by(message_id=msg.id))
+            self.assertEqual(owners, sorted([self.testuser.id, 20]))
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = 20
+
+            res = c.get("/")
+            self.assertIn(b'Hello followers', res.data)
+
     def test_add_msg_without_session(self):
         """ Does messages_add() prevent adding a message without a valid user session? """
         with self.client as c:
@@ -129,6 +180,112 @@ class MessageViewTestCase(TestCase):
             self.assertIn(b'My Test MSG', res.data)
             self.assertIn(b'@testuser', res.data)
     
+    def test_view_msg_not_modified(self):
+        """ Does messages_show(message_id) answer a repeat visit with 304 until the author changes? """
+
+        new_msg = Message(id=7, text="My Test MSG", user_id=self.testuser.id)
+        db.session.add(new_msg)
+        db.session.commit()
+        user_id = self.testuser.id
+
+        with self.client as c:
+            res = c.get("/messages/7")
+            etag = res.headers['ETag']
+
+            self.assertEqual(res.status_code, 200)
+            self.assertIn('Last-Modified', res.headers)
+
+            res = c.get("/messages/7", headers={'If-None-Match': etag})
+
+            self.assertEqual(res.status_code, 304)
+            self.assertEqual(res.data, b'')
+
+            User.query.filter_by(id=user_id).update({User.profile_version: User.profile_version + 1})
+            db.session.commit()
+            res = c.get("/messages/7", headers={'If-None-Match': etag})
+
+            self.assertEqual(res.status_code, 200)
+            self.assertNotEqual(res.headers['ETag'], etag)
+
+            etag = res.headers['ETag']
+            build = app.config['BUILD_VERSION']
+            app.config['BUILD_VERSION'] = 'next-release'
+
+            try:
+                res = c.get("/messages/7", headers={'If-None-Match': etag})
+            finally:
+                app.config['BUILD_VERSION'] = build
+
+            self.assertEqual(res.status_code, 200)
+
+    def test_view_msg_query_count(self):
+        """ Does messages_show(message_id) load the author with the message? """
+
+        new_msg = Message(id=7, text="My Test MSG", user_id=self.testuser.id)
+        db.session.add(new_msg)
+        db.session.commit()
+
+        #start from an empty identity map, like a real request would
+        db.session.expunge_all()
+
+        with self.client as c:
+            res = c.get("/messages/7")
+
+            #one query for the message and its author
+            self.assertEqual(res.headers['X-Query-Count'], '1')
+
+    def test_homepage_query_count(self):
+        """ Does the homepage run the same number of queries however many authors are on it? """
+
+        counts = []
+
+        for num_authors in [1, 6]:
+            for i in range(num_authors):
+                author = User.signup(username=f"author{num_authors}-{i}", email=f"author{num_authors}-{i}@test.com", password="password", image_url=None)
+                db.session.commit()
+                db.session.add(Follows(user_being_followed_id=author.id, user_following_id=self.testuser.id))
+                db.session.add(Message(text=f"Hi from author {i}", user_id=author.id))
+            db.session.commit()
+            TimelineEntry.backfill()
+            db.session.commit()
+
+            with self.client as c:
+                with c.session_transaction() as sess:
+                    sess[CURR_USER_KEY] = self.testuser.id
+
+                res = c.get("/")
+                counts.append(res.headers['X-Query-Count'])
+
+        self.assertEqual(counts[0], counts[1])
+
+    def test_homepage_not_modified(self):
+        """ Does the homepage answer a repeat visit with 304 until the timeline changes? """
+
+        author = User.signup(username="author", email="author@test.com", password="password", image_url=None)
+        db.session.commit()
+        author_id, user_id = author.id, self.testuser.id
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = user_id
+
+            c.post(f"/users/follow/{author_id}")
+            res = c.get("/")
+            etag = res.headers['ETag']
+
+            res = c.get("/", headers={'If-None-Match': etag})
+            self.assertEqual(res.status_code, 304)
+
+            msg = Message(text="Something new", user_id=author_id)
+            db.session.add(msg)
+            db.session.flush()
+            TimelineEntry.fan_out(msg)
+            db.session.commit()
+
+            res = c.get("/", headers={'If-None-Match': etag})
+            self.assertEqual(res.status_code, 200)
+            self.assertIn(b'Something new', res.data)
+
     def test_view_invalid_msg(self):
         """ Does messages_show(message_id) handle request for an invalid msg? """
         with self.client as c:
@@ -157,6 +314,29 @@ class MessageViewTestCase(TestCase):
 
             self.assertEqual(res.status_code, 200)
             self.assertEqual(len(Message.query.all()), 0)
+
+    def test_delete_msg_clears_timelines(self):
+        """ Does messages_destroy(message_id) remove the msg from every timeline? """
+
+        new_msg = Message(id=10, text="My Test MSG", user_id=self.testuser.id)
+        db.session.add(new_msg)
+        db.session.flush()
+        TimelineEntry.fan_out(new_msg)
+        self.testuser.messages_count = 1
+        db.session.commit()
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testuser.id
+
+            c.get(f"/users/{self.testuser.id}")
+            self.assertIn(10, fragment_cache._entries)
+
+            c.post("/messages/10/delete", data={})
+
+            self.assertNotIn(10, fragment_cache._entries)
+            self.assertEqual(TimelineEntry.query.count(), 0)
+            self.assertEqual(User.query.get(self.testuser.id).messages_count, 0)
     
     def test_delete_msg_invalid_user(self):
         """ Does messages_destroy(message_id) prevent deleting a msg when the user is invalid? """
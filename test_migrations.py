@@ -0,0 +1,106 @@
+"""Migration and index tests."""
+# FLASK_ENV=production python3 -m unittest test_migrations.py
+
+import os
+from unittest import TestCase
+
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+
+from models import db, SEARCH_INDEXES, create_search_indexes
+
+#set environment to test database
+os.environ['DATABASE_URL'] = "postgresql:///warbler-test"
+#use the testing config profile (see config.py)
+os.environ['FLASK_CONFIG'] = "testing"
+# import app after setting DB
+from wsgi import app
+from index_check import check_indexes
+
+ALEMBIC_CONFIG = Config(os.path.join(os.path.dirname(__file__), 'alembic.ini'))
+
+
+class MigrationTestCase(TestCase):
+    """Test that migrations build the same schema as the models."""
+
+    def setUp(self):
+        """ Start from an empty database. """
+
+        db.session.remove()
+        db.drop_all()
+        db.engine.execute("DROP TABLE IF EXISTS alembic_version")
+
+    def tearDown(self):
+        """ Leave the schema the other tests expect behind. """
+
+        db.session.remove()
+        db.drop_all()
+        db.engine.execute("DROP TABLE IF EXISTS alembic_version")
+
+    def test_upgrade_matches_models(self):
+        """ Does `alembic upgrade head` produce exactly the schema in models.py? """
+
+        command.upgrade(ALEMBIC_CONFIG, 'head')
+
+        #the search indexes are managed by migrations; models.py doesn't declare them
+        opts = {'include_object': lambda obj, name, type_, *args: name not in SEARCH_INDEXES}
+
+        with db.engine.connect() as conn:
+            diff = compare_metadata(MigrationContext.configure(conn, opts=opts), db.metadata)
+
+        self.assertEqual(diff, [])
+
+    def test_downgrade(self):
+        """ Can every migration be rolled back? """
+
+        command.upgrade(ALEMBIC_CONFIG, 'head')
+        command.downgrade(ALEMBIC_CONFIG, 'base')
+
+        self.assertEqual(db.engine.table_names(), ['alembic_version'])
+
+    def test_upgrade_from_baseline(self):
+        """ Does a database from before migrations get its timelines and counts filled in? """
+
+        command.upgrade(ALEMBIC_CONFIG, '0001')
+        db.engine.execute("""
+            INSERT INTO users (id, email, username, password) VALUES (1, 'a@test.com', 'a', '-'), (2, 'b@test.com', 'b', '-');
+            INSERT INTO follows (user_being_followed_id, user_following_id) VALUES (2, 1), (1, 1);
+            INSERT INTO messages (id, text, timestamp, user_id) VALUES (1, 'hi', now(), 1), (2, 'yo', now(), 2);
+            INSERT INTO likes (user_id, message_id) VALUES (1, 2);
+        """)
+
+        command.upgrade(ALEMBIC_CONFIG, 'head')
+
+        self.assertEqual(db.engine.execute(
+            "SELECT user_id, message_id FROM timeline_entries ORDER BY user_id, message_id").fetchall(),
+            [(1, 1), (1, 2), (2, 2)])
+        self.assertEqual(db.engine.execute(
+            "SELECT messages_count, followers_count, following_count, likes_count FROM users ORDER BY id").fetchall(),
+            [(1, 1, 2, 1), (1, 1, 0, 0)])
+
+    def test_likes_migration_keeps_likes(self):
+        """ Does the likes rekeying keep existing likes and count them per message? """
+
+        command.upgrade(ALEMBIC_CONFIG, '0007')
+        db.engine.execute("""
+            INSERT INTO users (id, email, username, password) VALUES (1, 'a@test.com', 'a', '-');
+            INSERT INTO messages (id, text, timestamp, user_id) VALUES (1, 'hi', now(), 1), (2, 'yo', now(), 1);
+            INSERT INTO likes (user_id, message_id) VALUES (1, 1);
+        """)
+
+        command.upgrade(ALEMBIC_CONFIG, 'head')
+
+        self.assertEqual(db.engine.execute("SELECT user_id, message_id FROM likes").fetchall(), [(1, 1)])
+        self.assertEqual(db.engine.execute("SELECT id, likes_count FROM messages ORDER BY id").fetchall(),
+                         [(1, 1), (2, 0)])
+
+    def test_hot_paths_use_indexes(self):
+        """ Can the planner serve every hot-path query from its index? """
+
+        db.create_all()
+        create_search_indexes()
+
+        for description, index, used, plan in check_indexes():
+            self.assertTrue(used, f"{description} doesn't use {index}:\n{plan}")
@@ -0,0 +1,93 @@
+"""Read replica routing tests."""
+# FLASK_ENV=production python3 -m unittest test_replicas.py
+
+import os
+from unittest import TestCase
+
+from models import db, User
+
+#set environment to test database
+os.environ['DATABASE_URL'] = "postgresql:///warbler-test"
+#use the testing config profile (see config.py)
+os.environ['FLASK_CONFIG'] = "testing"
+
+from wsgi import app
+from app import CURR_USER_KEY
+from replicas import PIN_KEY
+
+#a second local database stands in for the replica
+REPLICA_URL = os.environ.get('REPLICA_DATABASE_URL', "postgresql:///warbler-test-replica")
+
+
+class ReplicaRoutingTestCase(TestCase):
+    """Test that reads go to the replica unless the client just wrote."""
+
+    def setUp(self):
+        """ Put the same users on both databases, with bios saying where they are. """
+
+        app.config['SQLALCHEMY_BINDS'] = {'replica_0': REPLICA_URL}
+        self.replica = db.get_engine(app, 'replica_0')
+
+        db.create_all()
+        db.metadata.create_all(self.replica)
+
+        reader = User.signup("reader", "reader@test.com", "password", None)
+        writer = User.signup("writer", "writer@test.com", "password", None)
+        reader.bio = writer.bio = "on the primary"
+        db.session.commit()
+
+        self.reader_id, self.writer_id = reader.id, writer.id
+
+        users = User.__table__
+        rows = [dict(row, bio="on the replica") for row in db.session.execute(users.select())]
+        self.replica.execute(users.insert(), rows)
+
+        #start requests from an empty identity map
+        db.session.remove()
+
+        self.client = app.test_client()
+
+    def tearDown(self):
+        """ Drop both databases' tables and forget the replica. """
+
+        db.session.rollback()
+        db.session.remove()
+        db.drop_all()
+        db.metadata.drop_all(self.replica)
+        app.config['SQLALCHEMY_BINDS'] = {}
+
+    def test_reads_use_replica(self):
+        """ Are GET requests answered from the replica? """
+
+        res = self.client.get(f"/users/{self.reader_id}")
+
+        self.assertIn(b"on the replica", res.data)
+
+    def test_reads_pinned_after_write(self):
+        """ Does a client read from the primary right after it writes, and the replica later? """
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.writer_id
+
+            c.post(f"/users/follow/{self.reader_id}")
+            res = c.get(f"/users/{self.reader_id}")
+
+            self.assertIn(b"on the primary", res.data)
+            self.assertIn(b"Unfollow", res.data)
+
+            with c.session_transaction() as sess:
+                sess[PIN_KEY] = 0
+
+            res = c.get(f"/users/{self.reader_id}")
+
+            self.assertIn(b"on the replica", res.data)
+
+    def test_reads_without_writes_not_pinned(self):
+        """ Does a POST that writes nothing leave the client on the replica? """
+
+        with self.client as c:
+            c.post("/login", data={"username": "reader", "password": "wrong"})
+
+            with c.session_transaction() as sess:
+                self.assertNotIn(PIN_KEY, sess)
@@ -0,0 +1,67 @@
+"""Seed loader tests."""
+# FLASK_ENV=production python3 -m unittest test_seed.py
+
+import io
+import os
+from contextlib import redirect_stdout
+from unittest import TestCase
+
+from sqlalchemy import create_engine
+
+from models import db, User, Message, Follows, TimelineEntry
+
+#set environment to test database
+os.environ['DATABASE_URL'] = "postgresql:///warbler-test"
+#use the testing config profile (see config.py)
+os.environ['FLASK_CONFIG'] = "testing"
+
+from wsgi import app
+from seed import seed, insert_csv, secondary_indexes
+
+
+class SeedTestCase(TestCase):
+    """Test loading the generator's CSV files."""
+
+    def tearDown(self):
+        db.session.rollback()
+        db.session.remove()
+        db.drop_all()
+
+    def test_copy_load(self):
+        """ Are the CSVs copied in, with indexes, timelines and counters rebuilt? """
+
+        with redirect_stdout(io.StringIO()) as out:
+            seed('generator')
+
+        self.assertEqual(User.query.count(), 300)
+        self.assertEqual(Message.query.count(), 1000)
+        self.assertEqual(Follows.query.count(), 5000)
+        self.assertGreater(TimelineEntry.query.count(), 1000)
+        self.assertIn("rows/s", out.getvalue())
+
+        self.assertEqual(User.reconcile_counts(), 0)
+        self.assertEqual(sum(u.messages_count for u in User.query), 1000)
+
+        indexes = {row[0] for row in db.session.execute(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = 'public'")}
+        self.assertTrue({index.name for index in secondary_indexes()} <= indexes)
+        #rebuilding the schema doesn't lose the search indexes models.py doesn't declare
+        self.assertIn('ix_users_username_prefix', indexes)
+
+        #ids loaded by COPY don't leave the sequence behind
+        u = User.signup("newbie", "newbie@test.com", "password", None)
+        db.session.commit()
+        self.assertEqual(u.id, 301)
+
+    def test_batched_insert(self):
+        """ Does the fallback insert the CSV rows in batches, converting types? """
+
+        engine = create_engine("sqlite://")
+        db.metadata.create_all(engine)
+
+        with engine.begin() as connection:
+            for name in ('users', 'messages'):
+                with open(f"generator/{name}.csv", newline='') as csv_file:
+                    insert_csv(connection, db.metadata.tables[name], csv_file)
+
+            self.assertEqual(connection.execute("SELECT count(*) FROM messages").scalar(), 1000)
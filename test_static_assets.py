@@ -0,0 +1,85 @@
+"""Static asset and response compression tests."""
+# FLASK_ENV=production python3 -m unittest test_static_assets.py
+
+import gzip
+import os
+import re
+from unittest import TestCase
+
+#set environment to test database
+os.environ['DATABASE_URL'] = "postgresql:///warbler-test"
+#use the testing config profile (see config.py)
+os.environ['FLASK_CONFIG'] = "testing"
+# import app after setting DB
+from wsgi import app
+from app import static_assets
+from compression import brotli
+from models import DEFAULT_IMAGE_URL
+
+
+class StaticAssetsTestCase(TestCase):
+    """Test fingerprinted static URLs and their caching."""
+
+    def setUp(self):
+        self.client = app.test_client()
+
+    def test_pages_link_fingerprinted_assets(self):
+        """ Do pages link to hashed static files, served with immutable caching? """
+
+        res = self.client.get("/")
+        match = re.search(r'href="(/static/stylesheets/style\.[0-9a-f]{12}\.css)"', res.data.decode())
+
+        self.assertIsNotNone(match)
+        self.assertRegex(res.data.decode(), r'/static/images/warbler-logo\.[0-9a-f]{12}\.png')
+
+        res = self.client.get(match.group(1))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.cache_control.max_age, 365 * 24 * 60 * 60)
+        self.assertTrue(res.cache_control.immutable)
+        #images referenced from the stylesheet are fingerprinted too
+        self.assertRegex(res.data.decode(), r'url\("/static/images/nav-bg\.[0-9a-f]{12}\.png"\)')
+
+    def test_unhashed_assets_still_served(self):
+        """ Do plain static URLs keep working, without the long cache? """
+
+        res = self.client.get("/static/images/default-pic.png")
+
+        self.assertEqual(res.status_code, 200)
+        self.assertFalse(res.cache_control.immutable)
+
+    def test_static_url_filter(self):
+        """ Are stored /static/ image URLs fingerprinted and other URLs left alone? """
+
+        with app.test_request_context():
+            self.assertEqual(static_assets.static_url(DEFAULT_IMAGE_URL),
+                             "/static/" + static_assets.manifest['images/default-pic.png'])
+            self.assertEqual(static_assets.static_url("https://example.com/me.png"),
+                             "https://example.com/me.png")
+            self.assertIsNone(static_assets.static_url(None))
+
+    def test_compressed_pages(self):
+        """ Are pages compressed with the client's preferred encoding? """
+
+        plain = self.client.get("/signup")
+        res = self.client.get("/signup", headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', res.headers['Vary'])
+        self.assertEqual(gzip.decompress(res.data), plain.data)
+        self.assertLess(len(res.data), len(plain.data))
+
+        if brotli is not None:
+            res = self.client.get("/signup", headers={'Accept-Encoding': 'gzip, br'})
+
+            self.assertEqual(res.headers['Content-Encoding'], 'br')
+            self.assertEqual(brotli.decompress(res.data), plain.data)
+
+    def test_images_not_compressed(self):
+        """ Are images and tiny responses left alone? """
+
+        res = self.client.get("/static/images/default-pic.png", headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', res.headers)
+
+        res = self.client.get("/users/99999/likes", headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', res.headers)
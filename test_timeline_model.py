@@ -0,0 +1,122 @@
+"""Timeline model tests."""
+# FLASK_ENV=production python3 -m unittest test_timeline_model.py
+
+import os
+from unittest import TestCase
+from models import db, User, Message, Follows, TimelineEntry
+
+#set environment to test database
+os.environ['DATABASE_URL'] = "postgresql:///warbler-test"
+#use the testing config profile (see config.py)
+os.environ['FLASK_CONFIG'] = "testing"
+# import app after setting DB
+from wsgi import app
+
+#create initial tables
+db.create_all()
+
+
+class TimelineModelTestCase(TestCase):
+    """Test materialized home timelines."""
+
+    def setUp(self):
+        """ Create test users, follows and messages. """
+        db.create_all()
+
+        self.user1 = User.signup("testuser1", "test1@test.com", "password1", None)
+        self.user1.id = 1
+        self.user2 = User.signup("testuser2", "test2@test.com", "password2", None)
+        self.user2.id = 2
+        self.user3 = User.signup("testuser3", "test3@test.com", "password3", None)
+        self.user3.id = 3
+        db.session.commit()
+
+        #user1 follows user2 only
+        db.session.add(Follows(user_being_followed_id=2, user_following_id=1))
+
+        db.session.add_all([
+            Message(id=1, text="From user1", user_id=1),
+            Message(id=2, text="From user2", user_id=2),
+            Message(id=3, text="From user3", user_id=3),
+        ])
+        db.session.commit()
+
+    def tearDown(self):
+        """ Rollback any failed sessions & drop tables. """
+
+        db.session.rollback()
+        db.session.remove()
+        db.drop_all()
+
+    def timeline(self, user_id):
+        return sorted(entry.message_id for entry in TimelineEntry.query.filter_by(user_id=user_id))
+
+    def test_fan_out(self):
+        """ Does fan_out add a message to the author's and followers' timelines only? """
+
+        msg = Message(id=4, text="Another from user2", user_id=2)
+        db.session.add(msg)
+        db.session.flush()
+        TimelineEntry.fan_out(msg)
+        db.session.commit()
+
+        self.assertEqual(self.timeline(1), [4])
+        self.assertEqual(self.timeline(2), [4])
+        self.assertEqual(self.timeline(3), [])
+
+    def test_add_and_remove_author(self):
+        """ Do add_author and remove_author copy and drop an author's messages? """
+
+        TimelineEntry.add_author(user_id=1, author_id=3)
+        db.session.commit()
+        self.assertEqual(self.timeline(1), [3])
+
+        TimelineEntry.remove_author(user_id=1, author_id=3)
+        db.session.commit()
+        self.assertEqual(self.timeline(1), [])
+
+    def test_self_follow(self):
+        """ Does a user following themself keep exactly one entry per own message? """
+
+        db.session.add(Follows(user_being_followed_id=3, user_following_id=3))
+        TimelineEntry.add_author(user_id=3, author_id=3)
+        msg = Message(id=4, text="Another from user3", user_id=3)
+        db.session.add(msg)
+        db.session.flush()
+        TimelineEntry.fan_out(msg)
+        db.session.commit()
+        self.assertEqual(self.timeline(3), [4])
+
+        self.assertEqual(TimelineEntry.backfill(), 5)
+        self.assertEqual(self.timeline(3), [3, 4])
+
+        TimelineEntry.remove_author(user_id=3, author_id=3)
+        db.session.commit()
+        self.assertEqual(self.timeline(3), [3, 4])
+
+    def test_backfill_command(self):
+        """ Does the backfill-timelines command rebuild timelines from follows? """
+
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=['backfill-timelines'])
+
+        self.assertIn("Wrote 4 timeline entries.", result.output)
+        self.assertEqual(self.timeline(1), [1, 2])
+        self.assertEqual(self.timeline(2), [2])
+        self.assertEqual(self.timeline(3), [3])
+
+    def test_home_feed(self):
+        """ Does home_feed include a user's own messages and those of users they follow? """
+
+        self.assertEqual(sorted(msg.id for msg in Message.home_feed(1)), [1, 2])
+        self.assertEqual(sorted(msg.id for msg in Message.home_feed(3)), [3])
+
+    def test_rebuild_command(self):
+        """ Does backfill-timelines --user-id rebuild just that user's timeline? """
+
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=['backfill-timelines', '--user-id', '1'])
+
+        self.assertIn("Wrote 2 timeline entries.", result.output)
+        self.assertEqual(self.timeline(1), [1, 2])
+        self.assertEqual(self.timeline(2), [])
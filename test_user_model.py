@@ -5,10 +5,13 @@
 #    FLASK_ENV=production python3 -m unittest test_user_model.py
 
 import os
+from datetime import datetime, timedelta
 from unittest import TestCase
 from sqlalchemy import exc
 
-from models import db, User, Message, Follows
+import models
+from models import db, hasher, User, Message, Follows, Likes, trigram_similarity
+from passwords import PasswordHasher, HasherBusy
 
 # BEFORE we import our app, let's set an environmental variable
 # to use a different database for tests (we need to do this
@@ -16,11 +19,13 @@ from models import db, User, Message, Follows
 # connected to the database
 
 os.environ['DATABASE_URL'] = "postgresql:///warbler-test"
+#use the testing config profile (see config.py)
+os.environ['FLASK_CONFIG'] = "testing"
 
 
 # Now we can import app
 
-from app import app
+from wsgi import app
 
 # Create our tables (we do this here, so we only create the tables
 # once for all tests --- in each test, we'll delete the data
@@ -114,6 +119,131 @@ class UserModelTestCase(TestCase):
 
         self.assertFalse(self.user1.is_followed_by(self.user2))
 
+    def test_following_ids_cached(self):
+        """ Are following/follower IDs loaded once and kept until clear_id_sets()? """
+
+        db.session.add(Follows(user_being_followed_id=self.user2.id, user_following_id=self.user1.id))
+        db.session.commit()
+
+        self.assertEqual(self.user1.following_ids, {self.user2.id})
+        self.assertEqual(self.user2.follower_ids, {self.user1.id})
+
+        Follows.query.delete()
+        db.session.commit()
+
+        self.assertTrue(self.user1.is_following(self.user2))
+
+        self.user1.clear_id_sets()
+        self.assertFalse(self.user1.is_following(self.user2))
+
+    def test_follow_times_in_utc(self):
+        """ Are follows and likes timed in UTC whether the app or the database sets the time? """
+
+        db.session.add(Message(id=1, text="warble", user_id=1))
+        db.session.flush()
+        db.session.execute("SET LOCAL TIME ZONE 'America/New_York'")
+        db.session.execute("INSERT INTO follows (user_being_followed_id, user_following_id) VALUES (2, 1)")
+        db.session.execute("INSERT INTO likes (user_id, message_id) VALUES (2, 1)")
+        self.assertTrue(Follows.add(user_following_id=2, user_being_followed_id=1))
+        self.assertTrue(Likes.add(user_id=1, message_id=1))
+
+        times = [row.created_at for model in (Follows, Likes) for row in model.query]
+        self.assertEqual(len(times), 4)
+        db.session.commit()
+
+        for created_at in times:
+            self.assertLess(abs(created_at - datetime.utcnow()), timedelta(minutes=1))
+
+######## Likes tests ##########
+    def test_user_is_liked(self):
+        """ Does is_liked detect which messages the user likes? """
+
+        msg1 = Message(text="Liked", user_id=self.user2.id)
+        msg2 = Message(text="Not liked", user_id=self.user2.id)
+        db.session.add_all([msg1, msg2])
+        db.session.commit()
+
+        db.session.add(Likes(user_id=self.user1.id, message_id=msg1.id))
+        db.session.commit()
+
+        self.assertTrue(self.user1.is_liked(msg1.id))
+        self.assertFalse(self.user1.is_liked(msg2.id))
+        self.assertEqual(self.user1.liked_message_ids, {msg1.id})
+
+######## Directory tests ##########
+    def test_directory_page(self):
+        """ Does directory_page return just the directory columns, a page at a time? """
+
+        rows, next_after = User.directory_page(per_page=1)
+
+        self.assertEqual(next_after, 1)
+        self.assertEqual(rows[0].username, self.user1.username)
+        self.assertFalse(hasattr(rows[0], 'password'))
+
+        rows, next_after = User.directory_page(after=1, per_page=1)
+
+        self.assertEqual(rows[0].id, 2)
+        self.assertIsNone(next_after)
+
+######## Search tests ##########
+    def test_trigram_similarity(self):
+        """ Does trigram_similarity match pg_trgm's similarity()? """
+
+        self.assertEqual(trigram_similarity("cat", "cat"), 1.0)
+        self.assertEqual(trigram_similarity("cat", "dog"), 0.0)
+        #pg_trgm: SELECT similarity('cat', 'cats') = 0.5
+        self.assertEqual(trigram_similarity("cat", "cats"), 0.5)
+        self.assertEqual(trigram_similarity("", "cat"), 0.0)
+
+    def test_search_ranked(self):
+        """ Does User.search rank closer matches first and honor the limit? """
+
+        for id, username in enumerate(["bobcat", "catherine", "cat", "dog"], start=3):
+            user = User.signup(username, f"{username}@test.com", "password", None)
+            user.id = id
+        db.session.commit()
+
+        results = [user.username for user in User.search("cat")]
+
+        self.assertEqual(results[0], "cat")
+        self.assertEqual(sorted(results), ["bobcat", "cat", "catherine"])
+        self.assertEqual(len(User.search("cat", limit=2)), 2)
+
+    def test_search_escapes_wildcards(self):
+        """ Are LIKE wildcards in the search term matched literally? """
+
+        self.assertEqual(User.search("%"), [])
+        self.assertEqual(User.search("_"), [])
+
+    def test_search_short_term(self):
+        """ Do terms too short for trigrams match username prefixes only? """
+
+        for id, username in enumerate(["bobcat", "Catherine", "cat"], start=3):
+            user = User.signup(username, f"{username}@test.com", "password", None)
+            user.id = id
+        db.session.commit()
+
+        self.assertEqual([user.username for user in User.search("ca")], ["cat", "Catherine"])
+
+    def test_search_fallback_keeps_best_matches(self):
+        """ Without pg_trgm, are the closest matches kept when there are more than the scan? """
+
+        for id, username in enumerate(["xcatx", "ycaty", "zcatz", "cat"], start=3):
+            user = User.signup(username, f"{username}@test.com", "password", None)
+            user.id = id
+        db.session.commit()
+
+        scan, models.SEARCH_FALLBACK_SCAN = models.SEARCH_FALLBACK_SCAN, 2
+        models._trigram_support[str(db.engine.url)] = False
+        try:
+            results = [user.username for user in User.search("cat")]
+        finally:
+            models.SEARCH_FALLBACK_SCAN = scan
+            #let has_trigram_search() look again
+            models._trigram_support.pop(str(db.engine.url))
+
+        self.assertEqual(results[0], "cat")
+
 ######## Signup tests ##########
     def test_signup_user_valid(self):
         """ Does User.signup() successfully create a new user given valid credentials? """
@@ -194,4 +324,50 @@ class UserModelTestCase(TestCase):
         """ Does User.authenticate fail to return a user when the password is invalid? """
 
         user = User.authenticate(self.user2.username, 'password1')
-        self.assertFalse(user)
\ No newline at end of file
+        self.assertFalse(user)
+
+    def test_user_authenticate_rehashes(self):
+        """ Does User.authenticate upgrade a hash made with a different work factor? """
+
+        self.assertTrue(self.user1.password.startswith('$2b$04$'))
+        hasher.get().log_rounds = 5
+
+        try:
+            user = User.authenticate(self.user1.username, 'password1')
+            db.session.commit()
+        finally:
+            hasher.get().log_rounds = 4
+
+        self.assertTrue(user.password.startswith('$2b$05$'))
+        self.assertTrue(User.authenticate(self.user1.username, 'password1'))
+
+######## Password hasher tests ##########
+    def test_hasher_pool(self):
+        """ Are hashes made and checked in the process pool? """
+
+        pool_hasher = PasswordHasher(log_rounds=4, pool_size=1)
+
+        try:
+            hashed = pool_hasher.hash('secret')
+            self.assertTrue(pool_hasher.check(hashed, 'secret'))
+            self.assertFalse(pool_hasher.check(hashed, 'wrong'))
+            #pool processes come from the forkserver, not a fork of this (threaded) process
+            self.assertNotEqual(pool_hasher._get_pool().submit(os.getppid).result(), os.getpid())
+        finally:
+            pool_hasher.shutdown()
+
+        stats = pool_hasher.stats()
+        self.assertEqual(stats['completed'], 3)
+        self.assertEqual(stats['pending'], 0)
+        self.assertEqual(stats['peak_pending'], 1)
+
+    def test_hasher_busy(self):
+        """ Is hashing refused when the queue is full? """
+
+        busy_hasher = PasswordHasher(log_rounds=4, max_pending=1)
+        busy_hasher._slots.acquire()
+
+        with self.assertRaises(HasherBusy):
+            busy_hasher.hash('secret')
+
+        self.assertEqual(busy_hasher.stats()['rejected'], 1)
@@ -2,13 +2,18 @@
 # FLASK_ENV=production python3 -m unittest test_user_views.py
 
 import os
+from datetime import datetime
 from unittest import TestCase
-from models import db, connect_db, Message, User, Follows, Likes
+from models import db, connect_db, Message, User, Follows, Likes, TimelineEntry, decode_cursor, hasher
 
 #set DB environment to test DB
 os.environ['DATABASE_URL'] = "postgresql:///warbler-test"
+#use the testing config profile (see config.py)
+os.environ['FLASK_CONFIG'] = "testing"
 
-from app import app, CURR_USER_KEY
+from wsgi import app
+from app import CURR_USER_KEY, create_app, fragment_cache, user_cache
+from config import TestingConfig
 #disable WTForm CSRF validation
 app.config['WTF_CSRF_ENABLED'] = False
 
@@ -54,6 +59,27 @@ class UserViewTestCase(TestCase):
             self.assertIn(b'@ilovecats', res.data)
             self.assertIn(b'@birbsrcool', res.data)
     
+    def test_show_users_pages(self):
+        """ Does list_users() page through users with 'after' and cap 'per_page'? """
+
+        with self.client as c:
+            res = c.get("/users?per_page=3")
+
+            self.assertIn(b'@testuser1', res.data)
+            self.assertIn(b'@ilovecats', res.data)
+            self.assertNotIn(b'@birbsrcool', res.data)
+            self.assertIn(b'/users?after=31&amp;per_page=3', res.data)
+
+            res = c.get("/users?after=31&per_page=3")
+
+            self.assertIn(b'@birbsrcool', res.data)
+            self.assertNotIn(b'@testuser1', res.data)
+            self.assertNotIn(b'More users', res.data)
+
+            res = c.get("/users?per_page=0")
+            self.assertIn(b'@testuser1', res.data)
+            self.assertIn(b'More users', res.data)
+
     def test_search_users(self):
         """ Does search only show users that match query? """
 
@@ -75,6 +101,98 @@ class UserViewTestCase(TestCase):
             self.assertEqual(res.status_code, 200)
             self.assertIn(b'@ilovecats', res.data)
     
+    def test_show_user_profile_not_modified(self):
+        """ Does users_show(user_id) answer a repeat visit with 304 until the page changes? """
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.user1.id
+
+            etag = c.get("/users/22").headers['ETag']
+            res = c.get("/users/22", headers={'If-None-Match': etag})
+
+            self.assertEqual(res.status_code, 304)
+
+            c.post("/users/follow/22")
+            res = c.get("/users/22", headers={'If-None-Match': etag})
+
+            self.assertEqual(res.status_code, 200)
+            self.assertIn(b'Unfollow', res.data)
+
+    def test_show_user_profile_pages(self):
+        """ Does users_show(user_id) link to older messages, and does the load more endpoint render just the rows? """
+
+        for i in range(101):
+            db.session.add(Message(text=f"Warble #{i}", user_id=self.user3.id))
+        db.session.commit()
+
+        with self.client as c:
+            res = c.get(f"/users/{self.user3.id}")
+
+            self.assertIn(b'Warble #100', res.data)
+            self.assertNotIn(b'Warble #0<', res.data)
+            self.assertIn(b'data-more-url="/feeds/messages?', res.data)
+
+            more_url = res.data.split(b'data-more-url="')[1].split(b'"')[0].decode().replace("&amp;", "&")
+            res = c.get(more_url)
+
+            self.assertEqual(res.status_code, 200)
+            self.assertIn(b'Warble #0<', res.data)
+            self.assertNotIn(b'<html', res.data)
+            self.assertNotIn(b'load-more', res.data)
+
+    def test_show_likes_query_count(self):
+        """ Does show_likes(user_id) run the same number of queries however many authors it lists? """
+
+        counts = []
+        author_ids = [self.user2.id, self.user3.id]
+        user1_id = self.user1.id
+
+        for author_id in author_ids:
+            msg = Message(text=f"Like me, from #{author_id}", user_id=author_id)
+            db.session.add(msg)
+            db.session.commit()
+            db.session.add(Likes(user_id=user1_id, message_id=msg.id))
+            db.session.commit()
+
+            with self.client as c:
+                with c.session_transaction() as sess:
+                    sess[CURR_USER_KEY] = user1_id
+
+                res = c.get(f"/users/{user1_id}/likes")
+                counts.append(res.headers['X-Query-Count'])
+
+        self.assertEqual(counts[0], counts[1])
+
+    def test_show_likes(self):
+        """ Does show_likes(user_id) list the messages a user has liked? """
+
+        msg = Message(text="Likeable!", user_id=self.user2.id)
+        db.session.add(msg)
+        db.session.commit()
+        db.session.add(Likes(user_id=self.user1.id, message_id=msg.id))
+        db.session.commit()
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.user1.id
+
+            res = c.get(f"/users/{self.user1.id}/likes")
+
+            self.assertEqual(res.status_code, 200)
+            self.assertIn(b'Likeable!', res.data)
+
+    def test_feed_page_requires_auth(self):
+        """ Does the load more endpoint keep private feeds private? """
+
+        with self.client as c:
+            self.assertEqual(c.get("/feeds/home").status_code, 401)
+            self.assertEqual(c.get(f"/feeds/likes?user_id={self.user1.id}").status_code, 401)
+            self.assertEqual(c.get("/feeds/home?before=garbage").status_code, 401)
+            self.assertEqual(c.get(f"/feeds/messages?user_id={self.user1.id}&before=garbage").status_code, 400)
+            self.assertEqual(c.get(f"/feeds/messages?user_id={self.user1.id}"
+                                   "&before=2020-01-01T00:00:00_99999999999999999999").status_code, 400)
+
     def test_view_user_following(self):
         """ Can authed user view list of users being followed by a user? """
         #setup test follows
@@ -96,6 +214,35 @@ class UserViewTestCase(TestCase):
             self.assertIn(b'@ilovecats', res.data)
             self.assertIn(b'@birbsrcool', res.data)
     
+    def test_view_user_following_pages(self):
+        """ Does show_following(user_id) page newest follow first and mark who the viewer follows? """
+
+        f1 = Follows(user_being_followed_id=self.user2.id, user_following_id=self.user1.id, created_at=datetime(2020, 1, 1))
+        f2 = Follows(user_being_followed_id=self.user3.id, user_following_id=self.user1.id, created_at=datetime(2020, 1, 2))
+        f3 = Follows(user_being_followed_id=self.user4.id, user_following_id=self.user1.id, created_at=datetime(2020, 1, 3))
+        #the viewer, user2, follows user4 only
+        f4 = Follows(user_being_followed_id=self.user4.id, user_following_id=self.user2.id)
+
+        db.session.add_all([f1, f2, f3, f4])
+        db.session.commit()
+
+        following, next_cursor = User.following_page(self.user1.id, limit=2)
+        self.assertEqual([person.username for person in following], ["birbsrcool", "ilovecats"])
+
+        following, last_cursor = User.following_page(self.user1.id, before=decode_cursor(next_cursor), limit=2)
+        self.assertEqual([person.username for person in following], ["testuser2"])
+        self.assertIsNone(last_cursor)
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.user2.id
+
+            res = c.get(f"/users/{self.user1.id}/following")
+
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.data.count(b'>Unfollow</button>'), 1)
+            self.assertIn(b'action="/users/stop-following/45"', res.data)
+
     def test_view_user_following_not_auth(self):
         """ Does show_following(user_id) prevent unauthed users from vieweing the user's follow list? """
 
@@ -169,6 +316,132 @@ class UserViewTestCase(TestCase):
             self.assertIn(b"@birbsrcool", res.data)
 
     
+    def test_follow_counts(self):
+        """ Do add_follow(follow_id) and stop_following(follow_id) keep follower/following counts up to date? """
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.user1.id
+
+            c.post("/users/follow/45")
+
+            self.assertEqual(User.query.get(10).following_count, 1)
+            self.assertEqual(User.query.get(45).followers_count, 1)
+
+            c.post("/users/stop-following/45")
+
+            self.assertEqual(User.query.get(10).following_count, 0)
+            self.assertEqual(User.query.get(45).followers_count, 0)
+
+    def test_follow_twice(self):
+        """ Are repeated follows and unfollows harmless, leaving the counts right? """
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.user1.id
+
+            c.post("/users/follow/45")
+            res = c.post("/users/follow/45")
+
+            self.assertEqual(res.status_code, 302)
+            self.assertEqual(Follows.query.count(), 1)
+            self.assertEqual(User.query.get(45).followers_count, 1)
+
+            c.post("/users/stop-following/45")
+            res = c.post("/users/stop-following/45")
+
+            self.assertEqual(res.status_code, 302)
+            self.assertEqual(Follows.query.count(), 0)
+            self.assertEqual(User.query.get(10).following_count, 0)
+            self.assertEqual(User.query.get(45).followers_count, 0)
+
+    def test_follow_self(self):
+        """ Can a user follow and unfollow themself and still post? """
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.user1.id
+
+            self.assertEqual(c.post("/users/follow/10").status_code, 302)
+            self.assertEqual(c.post("/api/follows/10").status_code, 200)
+            self.assertEqual(c.post("/messages/new", data={"text": "Hello me"}).status_code, 302)
+            self.assertEqual(TimelineEntry.query.filter_by(user_id=10).count(), 1)
+
+            self.assertEqual(c.delete("/api/follows/10").json['following'], False)
+            self.assertEqual(TimelineEntry.query.filter_by(user_id=10).count(), 1)
+
+    def test_api_follow(self):
+        """ Do the follow API's POST and DELETE return the new state and both users' counts? """
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.user1.id
+
+            res = c.post("/api/follows/45")
+
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.json, {
+                'user_id': 45,
+                'following': True,
+                'counts': {'10': {'following_count': 1, 'followers_count': 0},
+                           '45': {'following_count': 0, 'followers_count': 1}},
+            })
+            self.assertEqual(Follows.query.count(), 1)
+
+            res = c.delete("/api/follows/45")
+
+            self.assertFalse(res.json['following'])
+            self.assertEqual(res.json['counts']['45']['followers_count'], 0)
+            self.assertEqual(Follows.query.count(), 0)
+
+            self.assertEqual(c.post("/api/follows/99999").status_code, 404)
+            self.assertEqual(c.delete("/api/follows/99999").status_code, 404)
+
+    def test_api_follow_not_auth(self):
+        """ Does the follow API answer 401 JSON to logged-out users? """
+
+        res = self.client.post("/api/follows/45")
+
+        self.assertEqual(res.status_code, 401)
+        self.assertIn('error', res.json)
+        self.assertEqual(Follows.query.count(), 0)
+
+    def test_add_follow_fills_timeline(self):
+        """ Does add_follow(follow_id) copy the followed user's messages into the homepage? """
+
+        msg = Message(text="Chirp chirp!", user_id=self.user4.id)
+        db.session.add(msg)
+        db.session.commit()
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.user1.id
+
+            c.post("/users/follow/45")
+            res = c.get("/")
+
+            self.assertEqual(TimelineEntry.query.filter_by(user_id=self.user1.id).count(), 1)
+            self.assertIn(b"Chirp chirp!", res.data)
+
+    def test_homepage_live_feed(self):
+        """ With MATERIALIZED_TIMELINES off, does the homepage read followed users' messages live? """
+
+        msg = Message(text="Not fanned out", user_id=self.user4.id)
+        db.session.add_all([msg, Follows(user_being_followed_id=self.user4.id, user_following_id=self.user1.id)])
+        db.session.commit()
+
+        app.config['MATERIALIZED_TIMELINES'] = False
+
+        try:
+            with self.client as c:
+                with c.session_transaction() as sess:
+                    sess[CURR_USER_KEY] = self.user1.id
+
+                res = c.get("/")
+                self.assertIn(b"Not fanned out", res.data)
+        finally:
+            app.config['MATERIALIZED_TIMELINES'] = True
+
     def test_add_follow_no_auth(self):
         """ Does add_follow(follow_id) prevent an unauthed user from adding a new follow? """
 
@@ -203,6 +476,25 @@ class UserViewTestCase(TestCase):
             self.assertNotIn(b"@ilovecats", res.data)
 
 
+    def test_stop_follow_clears_timeline(self):
+        """ Does stop_following(follow_id) remove the unfollowed user's messages from the homepage? """
+
+        msg = Message(text="Meow!", user_id=self.user3.id)
+        db.session.add_all([msg, Follows(user_being_followed_id=self.user3.id, user_following_id=self.user1.id)])
+        db.session.commit()
+        TimelineEntry.backfill()
+        db.session.commit()
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.user1.id
+
+            c.post("/users/stop-following/31")
+            res = c.get("/")
+
+            self.assertEqual(TimelineEntry.query.filter_by(user_id=self.user1.id).count(), 0)
+            self.assertNotIn(b"Meow!", res.data)
+
     def test_stop_follow_no_auth(self):
         """ Does stop_following(follow_id) prevent an unauthed user from un-following a user? """
 
@@ -237,6 +529,114 @@ class UserViewTestCase(TestCase):
             self.assertEqual(updated_user.email, "num@one.com")
 
     
+    def test_edit_profile_refreshes_cached_messages(self):
+        """ Do cached timeline rows show the new username after a profile edit? """
+
+        msg = Message(text="Cache me", user_id=self.user1.id)
+        db.session.add(msg)
+        db.session.commit()
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.user1.id
+
+            c.get(f"/users/{self.user1.id}")
+            hits = fragment_cache.hits
+            res = c.get(f"/users/{self.user1.id}")
+
+            self.assertEqual(fragment_cache.hits, hits + 1)
+            self.assertIn(b'>@testuser1</a>', res.data)
+
+            c.post("/users/profile", data={"username": "im#1", "email": "num@one.com", "image_url": "/static/images/default-pic.png", "header_image_url": "/static/images/warbler-hero.jpg", "bio": "I'm #1!!", "location": "Denver", "password": "testuser1"})
+            res = c.get(f"/users/{self.user1.id}")
+
+            self.assertIn(b'>@im#1</a>', res.data)
+            self.assertNotIn(b'>@testuser1</a>', res.data)
+
+    def test_current_user_cache(self):
+        """ Is the logged-in user loaded lazily and reloaded after a profile edit? """
+
+        user_cache.clear()
+        app.config['USER_CACHE_TTL'] = 60
+
+        try:
+            with self.client as c:
+                with c.session_transaction() as sess:
+                    sess[CURR_USER_KEY] = self.user1.id
+
+                c.get("/static/stylesheets/style.css")
+                self.assertEqual(user_cache.misses, 0)
+
+                c.get("/users/profile")
+                res = c.get("/users/profile")
+                self.assertEqual((user_cache.misses, user_cache.hits), (1, 1))
+                self.assertIn(b'value="testuser1"', res.data)
+
+                c.post("/users/profile", data={"username": "im#1", "email": "num@one.com", "image_url": "/static/images/default-pic.png", "header_image_url": "/static/images/warbler-hero.jpg", "bio": "I'm #1!!", "location": "Denver", "password": "testuser1"})
+                res = c.get("/users/profile")
+
+                self.assertEqual(user_cache.misses, 2)
+                self.assertIn(b'value="im#1"', res.data)
+        finally:
+            app.config['USER_CACHE_TTL'] = 0
+            user_cache.clear()
+
+    def test_current_user_cache_password(self):
+        """ Is a password changed elsewhere checked against the new hash, not a cached one? """
+
+        user_cache.clear()
+        app.config['USER_CACHE_TTL'] = 60
+
+        try:
+            with self.client as c:
+                with c.session_transaction() as sess:
+                    sess[CURR_USER_KEY] = self.user1.id
+
+                c.get("/users/profile")
+                c.get("/users/profile")
+                self.assertEqual(user_cache.hits, 1)
+
+                db.session.execute(User.__table__.update().where(User.id == 10).values(
+                    password=hasher.hash("newpassword")))
+                db.session.commit()
+
+                res = c.post("/users/profile", data={"username": "im#1", "email": "num@one.com", "image_url": "/static/images/default-pic.png", "header_image_url": "/static/images/warbler-hero.jpg", "bio": "I'm #1!!", "location": "Denver", "password": "testuser1"})
+
+                self.assertEqual(res.status_code, 200)
+                self.assertEqual(user_cache.hits, 2)
+                self.assertEqual(User.query.get(10).username, "testuser1")
+        finally:
+            app.config['USER_CACHE_TTL'] = 0
+            user_cache.clear()
+
+    def test_current_user_cache_deleted(self):
+        """ Is a cached user whose account was deleted elsewhere logged out, not a 500? """
+
+        user_cache.clear()
+        app.config['USER_CACHE_TTL'] = 60
+
+        try:
+            with self.client as c:
+                with c.session_transaction() as sess:
+                    sess[CURR_USER_KEY] = self.user1.id
+
+                c.get("/users/profile")
+
+                db.session.execute(User.__table__.delete().where(User.id == 10))
+                db.session.commit()
+                db.session.remove()
+
+                #the home page reads the counters, which the snapshot leaves out
+                res = c.get("/")
+
+                self.assertEqual(res.status_code, 302)
+                self.assertEqual(user_cache.hits, 1)
+                with c.session_transaction() as sess:
+                    self.assertNotIn(CURR_USER_KEY, sess)
+        finally:
+            app.config['USER_CACHE_TTL'] = 0
+            user_cache.clear()
+
     def test_edit_profile_no_auth(self):
         """ Is an unauthed user prevented from editing a profile? """
 
@@ -260,6 +660,45 @@ class UserViewTestCase(TestCase):
             self.assertEqual(res.status_code, 200)
             self.assertEqual(len(all_users), 3)
 
+    def test_delete_user_counts(self):
+        """ Does delete_user() fix the counts of users who followed or liked the deleted user? """
+
+        msg = Message(text="Soon to be gone", user_id=self.user1.id)
+        db.session.add(msg)
+        db.session.commit()
+        db.session.add_all([
+            Follows(user_being_followed_id=self.user1.id, user_following_id=self.user2.id),
+            Follows(user_being_followed_id=self.user3.id, user_following_id=self.user1.id),
+            Likes(user_id=self.user4.id, message_id=msg.id),
+        ])
+        db.session.commit()
+        User.reconcile_counts()
+        db.session.commit()
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.user1.id
+
+            res = c.post("/users/delete", follow_redirects=True)
+
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(User.query.get(22).following_count, 0)
+            self.assertEqual(User.query.get(31).followers_count, 0)
+            self.assertEqual(User.query.get(45).likes_count, 0)
+            self.assertEqual(len(Message.query.all()), 0)
+
+    def test_reconcile_counts_command(self):
+        """ Does the reconcile-counts command fix counts that have drifted? """
+
+        db.session.add(Follows(user_being_followed_id=self.user2.id, user_following_id=self.user1.id))
+        db.session.commit()
+
+        result = app.test_cli_runner().invoke(args=['reconcile-counts'])
+
+        self.assertIn("Fixed counts for 2 users and 0 messages.", result.output)
+        self.assertEqual(User.query.get(10).following_count, 1)
+        self.assertEqual(User.query.get(22).followers_count, 1)
+
     def test_delete_user_no_auth(self):
         """ Does delete_user() prevent access for unauthed users? """
 
@@ -295,6 +734,66 @@ class UserViewTestCase(TestCase):
             self.assertEqual(len(user1.likes), 1)
             self.assertEqual(user1.likes[0].id, 5)
             self.assertEqual(user1.likes[0].user_id, 22)
+            self.assertEqual(user1.likes_count, 1)
+
+    def test_user_like_twice(self):
+        """ Are repeated likes and unlikes harmless, leaving likes_count right? """
+
+        msg = Message(text="Test message for user 2!", user_id=self.user2.id)
+        msg.id = 5
+        db.session.add(msg)
+        db.session.commit()
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.user1.id
+
+            c.post("/users/add_like/5")
+            c.post("/users/add_like/5")
+
+            self.assertEqual(Likes.query.count(), 1)
+            self.assertEqual(User.query.get(10).likes_count, 1)
+
+            c.post("/users/remove_like/5")
+            res = c.post("/users/remove_like/5")
+
+            self.assertEqual(res.status_code, 302)
+            self.assertEqual(Likes.query.count(), 0)
+            self.assertEqual(User.query.get(10).likes_count, 0)
+
+    def test_api_like(self):
+        """ Does the like API toggle a like with a few small queries and no page render? """
+
+        msg = Message(text="Test message for user 2!", user_id=self.user2.id)
+        msg.id = 5
+        db.session.add(msg)
+        db.session.commit()
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.user1.id
+
+            res = c.post("/api/likes/5")
+
+            self.assertEqual(res.json, {'message_id': 5, 'liked': True, 'likes_count': 1,
+                                        'counts': {'10': {'likes_count': 1}}})
+            #insert, two counter updates and two counts reads
+            self.assertEqual(res.headers['X-Query-Count'], '5')
+
+            #the home feed marks it liked
+            c.post("/api/follows/22")
+            res = c.get("/")
+            self.assertIn(b'data-api-url="/api/likes/5" data-active="true"', res.data)
+
+            res = c.delete("/api/likes/5")
+
+            self.assertEqual(res.json['liked'], False)
+            self.assertEqual(res.json['likes_count'], 0)
+            self.assertEqual(res.json['counts'], {'10': {'likes_count': 0}})
+            self.assertEqual(Likes.query.count(), 0)
+
+            self.assertEqual(c.post("/api/likes/99999").status_code, 404)
+            self.assertEqual(c.delete("/api/likes/99999").status_code, 404)
 
     def test_user_add_like_no_auth(self):
         """ Does add_like(message_id) prevent a unauthed user from adding a like? """
@@ -373,4 +872,50 @@ class UserViewTestCase(TestCase):
             self.assertEqual(res.status_code, 200)
             self.assertEqual(len(Message.query.all()), 2)
             self.assertEqual(len(Likes.query.all()), 2)
-            self.assertIn(b"Access unauthorized.", res.data)
\ No newline at end of file
+            self.assertIn(b"Access unauthorized.", res.data)
+
+
+class SQLiteTestingConfig(TestingConfig):
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    WTF_CSRF_ENABLED = False
+
+
+class SQLiteUserViewTestCase(TestCase):
+    """Test follow and like writes on SQLite, which has no ON CONFLICT DO NOTHING."""
+
+    def setUp(self):
+        """ Build an app on an in-memory SQLite database with two users and a message. """
+
+        db.session.remove()
+        self.app = create_app(SQLiteTestingConfig)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+
+        User.signup(username="testuser1", email="test1@test.com", password="testuser1", image_url=None).id = 10
+        User.signup(username="testuser2", email="test2@test.com", password="testuser2", image_url=None).id = 22
+        db.session.add(Message(id=5, text="Hello", user_id=22))
+        db.session.commit()
+
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        self.context.pop()
+
+    def test_follow_and_like_twice(self):
+        """ Do repeated follows and likes add one row and move each counter by one? """
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = 10
+
+            for _ in range(2):
+                self.assertEqual(c.post("/users/follow/22").status_code, 302)
+                self.assertEqual(c.post("/users/add_like/5").status_code, 302)
+
+            self.assertEqual(Follows.query.count(), 1)
+            self.assertEqual(Likes.query.count(), 1)
+            self.assertEqual((User.query.get(10).following_count, User.query.get(10).likes_count), (1, 1))
+            self.assertEqual(User.query.get(22).followers_count, 1)
+            self.assertEqual(Message.query.get(5).likes_count, 1)
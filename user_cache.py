@@ -0,0 +1,103 @@
+"""Per-process cache of the logged-in user's profile.
+
+Most requests only need the current user's id (which is in the session) or
+a handful of profile columns, so loading the user with a SELECT on every
+request is wasted work. The cache keeps a snapshot of the profile columns
+for USER_CACHE_TTL seconds and turns it back into a User attached to the
+request's session without querying.
+
+The *_count columns and the password hash are left out of the snapshot:
+the counts change on other users' actions and the hash can change in
+another worker, so they're loaded (in one SELECT) only when something reads
+them. Views that change a profile call forget() so the next request reloads.
+A snapshot can outlive its user: if the account was deleted in another
+process, that load raises ObjectDeletedError, and the app calls reload() to
+drop the snapshot and look the user up again.
+"""
+
+from threading import Lock
+from time import monotonic
+
+from flask import current_app
+from sqlalchemy.orm import make_transient_to_detached
+
+from models import db, User
+
+COUNTER_COLUMNS = {'messages_count', 'followers_count', 'following_count', 'likes_count'}
+
+# never served from a snapshot: a stale hash would accept an old password
+UNCACHED_COLUMNS = COUNTER_COLUMNS | {'password'}
+
+
+class UserCache:
+    """A TTL'd map of user id -> profile column values."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = Lock()
+
+    def get(self, user_id):
+        """The User with `user_id`, attached to the current session, or None."""
+
+        existing = db.session.identity_map.get(db.session.identity_key(User, user_id))
+        if existing is not None:
+            return existing
+
+        ttl = current_app.config.get('USER_CACHE_TTL', 0)
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+
+            if entry is not None and monotonic() - entry[0] < ttl:
+                self.hits += 1
+                return self._attach(entry[1])
+
+            self.misses += 1
+
+        user = User.query.get(user_id)
+
+        if user is not None and ttl > 0:
+            snapshot = {attr.key: getattr(user, attr.key)
+                        for attr in User.__mapper__.column_attrs
+                        if attr.key not in UNCACHED_COLUMNS}
+
+            with self._lock:
+                self._entries[user_id] = (monotonic(), snapshot)
+
+        return user
+
+    def forget(self, user_id):
+        """Drop a user's snapshot (e.g. after their profile changes)."""
+
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def reload(self, user_id):
+        """Drop `user_id`'s snapshot and stale session copy; load the user afresh, or None."""
+
+        self.forget(user_id)
+
+        stale = db.session.identity_map.get(db.session.identity_key(User, user_id))
+        if stale is not None:
+            db.session.expunge(stale)
+
+        return User.query.get(user_id)
+
+    def clear(self):
+        """Drop everything."""
+
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    @staticmethod
+    def _attach(snapshot):
+        """Rebuild a persistent User from `snapshot` without a SELECT."""
+
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        db.session.add(user)
+
+        return user
@@ -0,0 +1,10 @@
+"""WSGI entry point: `gunicorn -c gunicorn.conf.py wsgi:app`.
+
+Builds the app once, using the FLASK_CONFIG profile (production unless set).
+"""
+
+import os
+
+from app import create_app
+
+app = create_app(os.environ.get('FLASK_CONFIG', 'production'))